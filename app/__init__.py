@@ -1,4 +1,6 @@
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from bson import ObjectId
 from pymongo import MongoClient
 from datetime import datetime
 from config import Config
@@ -70,6 +72,8 @@ def _get_mongodb_client():
             'socketTimeoutMS': 30000,  # Increased timeout for serverless
             'retryWrites': True,
             'retryReads': True,
+            'maxPoolSize': Config.MONGODB_MAX_POOL_SIZE,
+            'minPoolSize': Config.MONGODB_MIN_POOL_SIZE,
         }
         
         # For serverless environments (like Vercel), configure TLS/SSL properly
@@ -158,9 +162,29 @@ class LazyDB:
 
 db = LazyDB()
 
+class MongoJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes ObjectId as its hex string
+    
+    Lets jsonify() and the |tojson template filter take MongoDB documents
+    directly, without first copying them to convert every ObjectId.
+    """
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = MongoJSONProvider(app)
+    
+    # Use server-side Redis sessions when REDIS_URL is configured
+    if app.config.get('SESSION_TYPE') == 'redis':
+        import redis
+        from flask_session import Session
+        app.config['SESSION_REDIS'] = redis.from_url(app.config['REDIS_URL'])
+        Session(app)
     
     # Add custom Jinja filters
     @app.template_filter('strftime')
@@ -175,7 +199,7 @@ def create_app(config_class=Config):
                 if 'T' in value or ' ' in value:
                     value = datetime.fromisoformat(value.replace('Z', '+00:00'))
                 else:
-                    value = datetime.strptime(value, '%Y-%m-%d')
+                    value = datetime.fromisoformat(value)
                 return value.strftime(fmt)
             except (ValueError, AttributeError):
                 return value  # Return original if parsing fails
@@ -231,7 +255,7 @@ def create_app(config_class=Config):
     def inject_navigation_context():
         """Inject navigation context into all templates"""
         from flask import request, session, url_for
-        from .models.feedlot import Feedlot
+        from .routes.auth_routes import get_request_feedlot
         from .utils.breadcrumbs import generate_breadcrumbs
         from bson import ObjectId
         import re
@@ -264,12 +288,9 @@ def create_app(config_class=Config):
             
             # Fetch feedlot data
             try:
-                feedlot = Feedlot.find_by_id(feedlot_id)
+                # Shares the route's lookup of the same feedlot; branding is part of the document
+                feedlot = get_request_feedlot(feedlot_id)
                 if feedlot:
-                    # Load branding data
-                    branding = Feedlot.get_branding(feedlot_id)
-                    if branding:
-                        feedlot['branding'] = branding
                     nav_context['current_feedlot'] = feedlot
                     nav_context['current_feedlot_code'] = feedlot.get('feedlot_code')
                     nav_context['show_feedlot_nav'] = True
@@ -2,7 +2,7 @@ from app import db
 from .user import User
 
 def init_db():
-    """Initialize master database collections (feedlots and users only)
+    """Initialize master database collections (feedlots, users and pens)
     
     Note: Feedlot-specific databases (pens, batches, cattle) are initialized
     when feedlots are created via Feedlot.initialize_feedlot_database()
@@ -17,6 +17,9 @@ def init_db():
         db.feedlots.create_index('feedlot_code', unique=True)
         db.feedlots.create_index('name')
         
+        # Pens are stored in the master database
+        db.pens.create_index([('feedlot_id', 1), ('pen_number', 1)])
+        
         print("Master database initialized successfully")
     except Exception as e:
         print(f"Error initializing master database indexes: {e}")
@@ -1,8 +1,19 @@
 from datetime import datetime
 from bson import ObjectId
+import re
 from app import get_feedlot_db
+from app.models.feedlot import Feedlot
 
 class Batch:
+    # Fields shown in the batch list view (induction_date is the legacy name for event_date)
+    LIST_FIELDS = {
+        'batch_number': 1,
+        'event_date': 1,
+        'induction_date': 1,
+        'event_type': 1,
+        'funder': 1,
+    }
+    
     @staticmethod
     def create_batch(feedlot_code, feedlot_id, batch_number, event_date, funder, notes=None, event_type='induction'):
         """Create a new batch
@@ -30,6 +41,7 @@ class Batch:
         }
         
         result = feedlot_db.batches.insert_one(batch_data)
+        Feedlot.invalidate_statistics_cache(feedlot_id)
         return str(result.inserted_id)
     
     @staticmethod
@@ -48,19 +60,58 @@ class Batch:
         return feedlot_db.batches.find_one(query)
     
     @staticmethod
-    def find_by_feedlot(feedlot_code, feedlot_id, include_deleted=False):
+    def find_by_feedlot(feedlot_code, feedlot_id, include_deleted=False, projection=None):
         """Find all batches for a feedlot
         
         Args:
             feedlot_code: The feedlot code (required for database selection)
             feedlot_id: The feedlot ID
             include_deleted: If True, include soft-deleted batches. Defaults to False.
+            projection: Optional projection limiting the returned fields
         """
         feedlot_db = get_feedlot_db(feedlot_code)
         query = {'feedlot_id': ObjectId(feedlot_id)}
         if not include_deleted:
             query['deleted_at'] = None
-        return list(feedlot_db.batches.find(query))
+        return list(feedlot_db.batches.find(query, projection))
+    
+    @staticmethod
+    def find_recent(feedlot_code, feedlot_id, limit=5, include_deleted=False):
+        """Find the most recent batches for a feedlot, latest event first
+        
+        Sorts on event_date (newest first, _id as tie-break) so the
+        (feedlot_id, event_date, _id) index serves the sort and limit directly.
+        Legacy batches without an event_date are backfilled by
+        scripts/ensure_feedlot_indexes.py.
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            feedlot_id: The feedlot ID
+            limit: Maximum number of batches to return. Defaults to 5.
+            include_deleted: If True, include soft-deleted batches. Defaults to False.
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        query = {'feedlot_id': ObjectId(feedlot_id)}
+        if not include_deleted:
+            query['deleted_at'] = None
+        cursor = feedlot_db.batches.find(query, {'cattle_ids': 0})
+        return list(cursor.sort([('event_date', -1), ('_id', -1)]).limit(limit))
+    
+    @staticmethod
+    def distinct_values(feedlot_code, feedlot_id, field, include_deleted=False):
+        """Get the distinct values of a field across a feedlot's batches (e.g. for filter dropdowns)
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            feedlot_id: The feedlot ID
+            field: Field name to collect values for
+            include_deleted: If True, include soft-deleted batches. Defaults to False.
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        query = {'feedlot_id': ObjectId(feedlot_id)}
+        if not include_deleted:
+            query['deleted_at'] = None
+        return feedlot_db.batches.distinct(field, query)
     
     @staticmethod
     def update_batch(feedlot_code, batch_id, update_data):
@@ -77,6 +128,8 @@ class Batch:
             {'_id': ObjectId(batch_id)},
             {'$set': update_data}
         )
+        # The batch's feedlot ID isn't known here, so drop all cached statistics
+        Feedlot.invalidate_statistics_cache()
     
     @staticmethod
     def delete_batch(feedlot_code, batch_id):
@@ -94,6 +147,8 @@ class Batch:
                 'updated_at': datetime.utcnow()
             }}
         )
+        # The batch's feedlot ID isn't known here, so drop all cached statistics
+        Feedlot.invalidate_statistics_cache()
     
     @staticmethod
     def get_cattle_count(feedlot_code, batch_id):
@@ -109,6 +164,27 @@ class Batch:
             'deleted_at': None
         })
     
+    @staticmethod
+    def get_cattle_counts(feedlot_code, batch_ids):
+        """Get number of cattle currently in each of several batches with one aggregation
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            batch_ids: Iterable of batch IDs
+        
+        Returns:
+            Dictionary mapping batch ObjectId to its cattle count (batches with no cattle are omitted)
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        pipeline = [
+            {'$match': {
+                'batch_id': {'$in': [ObjectId(batch_id) for batch_id in batch_ids]},
+                'deleted_at': None
+            }},
+            {'$group': {'_id': '$batch_id', 'count': {'$sum': 1}}}
+        ]
+        return {row['_id']: row['count'] for row in feedlot_db.cattle.aggregate(pipeline)}
+    
     @staticmethod
     def add_cattle_to_batch(feedlot_code, batch_id, cattle_record_id):
         """Add a cattle record ID to the batch's historical cattle_ids array
@@ -158,19 +234,8 @@ class Batch:
         return len(cattle_ids)
     
     @staticmethod
-    def find_by_feedlot_with_filters(feedlot_code, feedlot_id, search=None, event_type=None, sort_by='event_date', sort_order='desc', include_deleted=False):
-        """Find batches with filtering and sorting
-        
-        Args:
-            feedlot_code: The feedlot code (required for database selection)
-            feedlot_id: The feedlot ID
-            search: Optional search term for batch_number or funder
-            event_type: Optional event type filter
-            sort_by: Field to sort by (batch_number, event_date, event_type, funder, cattle_count)
-            sort_order: Sort order ('asc' or 'desc')
-            include_deleted: If True, include soft-deleted batches. Defaults to False.
-        """
-        feedlot_db = get_feedlot_db(feedlot_code)
+    def _filter_query(feedlot_id, search=None, event_type=None, include_deleted=False):
+        """Build the batch list query shared by find_by_feedlot_with_filters and count_with_filters"""
         query = {'feedlot_id': ObjectId(feedlot_id)}
         
         # Exclude soft-deleted records by default
@@ -179,15 +244,38 @@ class Batch:
         
         # Add search filter for batch_number or funder
         if search:
+            # Escape the term so it is matched literally, not as a user-supplied regex
+            search_pattern = re.escape(search)
             query['$or'] = [
-                {'batch_number': {'$regex': search, '$options': 'i'}},
-                {'funder': {'$regex': search, '$options': 'i'}}
+                {'batch_number': {'$regex': search_pattern, '$options': 'i'}},
+                {'funder': {'$regex': search_pattern, '$options': 'i'}}
             ]
         
         # Add event type filter
         if event_type:
             query['event_type'] = event_type
         
+        return query
+    
+    @staticmethod
+    def find_by_feedlot_with_filters(feedlot_code, feedlot_id, search=None, event_type=None, sort_by='event_date', sort_order='desc', include_deleted=False, projection=None, limit=None, skip=0):
+        """Find batches with filtering and sorting
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            feedlot_id: The feedlot ID
+            search: Optional search term for batch_number or funder
+            event_type: Optional event type filter
+            sort_by: Field to sort by (batch_number, event_date, event_type, funder, cattle_count)
+            sort_order: Sort order ('asc' or 'desc')
+            include_deleted: If True, include soft-deleted batches. Defaults to False.
+            projection: Optional projection limiting the returned fields (e.g. Batch.LIST_FIELDS)
+            limit: Optional maximum number of batches to return (for pagination)
+            skip: Number of batches to skip (for pagination)
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        query = Batch._filter_query(feedlot_id, search, event_type, include_deleted)
+        
         # Define sort order
         sort_direction = 1 if sort_order == 'asc' else -1
         
@@ -201,13 +289,22 @@ class Batch:
         }
         
         sort_field = sort_field_map.get(sort_by, 'event_date')
-        sort_criteria = [(sort_field, sort_direction)]
+        # Tie-break on _id so pages don't overlap when the sort field has duplicates
+        sort_criteria = [(sort_field, sort_direction), ('_id', sort_direction)]
         
-        batches = list(feedlot_db.batches.find(query).sort(sort_criteria))
+        cursor = feedlot_db.batches.find(query, projection).sort(sort_criteria)
+        # cattle_count is computed below, so that sort (and its paging) has to happen in Python
+        if sort_by != 'cattle_count':
+            if skip > 0:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+        batches = list(cursor)
         
-        # Add cattle count to each batch
+        # Add cattle count to each batch (counted in a single aggregation)
+        cattle_counts = Batch.get_cattle_counts(feedlot_code, [batch['_id'] for batch in batches])
         for batch in batches:
-            batch['cattle_count'] = Batch.get_cattle_count(feedlot_code, str(batch['_id']))
+            batch['cattle_count'] = cattle_counts.get(batch['_id'], 0)
             # Normalize: ensure event_date exists (for backward compatibility with induction_date)
             if 'event_date' not in batch and 'induction_date' in batch:
                 batch['event_date'] = batch['induction_date']
@@ -218,6 +315,25 @@ class Batch:
         # If sorting by cattle_count, sort after adding the count
         if sort_by == 'cattle_count':
             batches.sort(key=lambda b: b.get('cattle_count', 0), reverse=(sort_order == 'desc'))
+            if limit:
+                batches = batches[skip:skip + limit]
+            elif skip > 0:
+                batches = batches[skip:]
         
         return batches
+    
+    @staticmethod
+    def count_with_filters(feedlot_code, feedlot_id, search=None, event_type=None, include_deleted=False):
+        """Count batches matching the same filters as find_by_feedlot_with_filters
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            feedlot_id: The feedlot ID
+            search: Optional search term for batch_number or funder
+            event_type: Optional event type filter
+            include_deleted: If True, include soft-deleted batches. Defaults to False.
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        query = Batch._filter_query(feedlot_id, search, event_type, include_deleted)
+        return feedlot_db.batches.count_documents(query)
 
@@ -1,10 +1,25 @@
 from datetime import datetime
 from bson import ObjectId
+import re
 from app import get_feedlot_db
 from app.models.pen import Pen
 from app.models.batch import Batch
+from app.models.feedlot import Feedlot
 
 class Cattle:
+    # Fields shown in cattle list views (cattle list and manifest export form)
+    LIST_FIELDS = {
+        'cattle_id': 1,
+        'sex': 1,
+        'weight': 1,
+        'cattle_status': 1,
+        'induction_date': 1,
+        'pen_id': 1,
+        'batch_id': 1,
+        'lf_tag': 1,
+        'uhf_tag': 1,
+    }
+    
     @staticmethod
     def create_cattle(feedlot_code, feedlot_id, cattle_id, sex, weight, 
                      cattle_status, batch_id=None, lf_tag=None, uhf_tag=None, pen_id=None, notes=None,
@@ -77,6 +92,7 @@ class Cattle:
         
         # Add initial audit log entry for creation
         Cattle.add_audit_log_entry(feedlot_code, cattle_record_id, 'created', f'Cattle record created (ID: {cattle_id})', created_by)
+        Feedlot.invalidate_statistics_cache(feedlot_id)
         
         return cattle_record_id
     
@@ -95,6 +111,45 @@ class Cattle:
             query['deleted_at'] = None
         return feedlot_db.cattle.find_one(query)
     
+    @staticmethod
+    def find_by_id_with_batch(feedlot_code, cattle_record_id, include_deleted=False):
+        """Find cattle by ID together with its (non-deleted) batch in a single aggregation
+        
+        Batches live in the same feedlot database as cattle, so they can be joined
+        with $lookup. Pens are in the master database and must be fetched separately.
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            cattle_record_id: The cattle record ID
+            include_deleted: If True, include soft-deleted cattle. Defaults to False.
+        
+        Returns:
+            Tuple of (cattle, batch); cattle is None if not found, batch is None if unassigned
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        query = {'_id': ObjectId(cattle_record_id)}
+        if not include_deleted:
+            query['deleted_at'] = None
+        pipeline = [
+            {'$match': query},
+            {'$limit': 1},
+            {'$lookup': {
+                'from': 'batches',
+                'let': {'batch_id': '$batch_id'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$_id', '$$batch_id']}, 'deleted_at': None}},
+                    {'$project': {'cattle_ids': 0}}
+                ],
+                'as': '_batch'
+            }}
+        ]
+        results = list(feedlot_db.cattle.aggregate(pipeline))
+        if not results:
+            return None, None
+        cattle = results[0]
+        batches = cattle.pop('_batch')
+        return cattle, (batches[0] if batches else None)
+    
     @staticmethod
     def find_by_cattle_id(feedlot_code, feedlot_id, cattle_id, include_deleted=False):
         """Find cattle by cattle ID
@@ -134,49 +189,70 @@ class Cattle:
         return feedlot_db.cattle.find_one(query)
     
     @staticmethod
-    def find_by_feedlot(feedlot_code, feedlot_id, include_deleted=False):
+    def find_by_feedlot(feedlot_code, feedlot_id, include_deleted=False, projection=None):
         """Find all cattle for a feedlot
         
         Args:
             feedlot_code: The feedlot code (required for database selection)
             feedlot_id: The feedlot ID
             include_deleted: If True, include soft-deleted cattle. Defaults to False.
+            projection: Optional projection limiting the returned fields
         """
         feedlot_db = get_feedlot_db(feedlot_code)
         query = {'feedlot_id': ObjectId(feedlot_id)}
         if not include_deleted:
             query['deleted_at'] = None
-        return list(feedlot_db.cattle.find(query))
+        return list(feedlot_db.cattle.find(query, projection))
     
     @staticmethod
-    def find_by_batch(feedlot_code, batch_id, include_deleted=False):
+    def find_by_batch(feedlot_code, batch_id, include_deleted=False, limit=None, skip=0, projection=None):
         """Find all cattle in a batch
         
         Args:
             feedlot_code: The feedlot code (required for database selection)
             batch_id: The batch ID
             include_deleted: If True, include soft-deleted cattle. Defaults to False.
+            limit: Optional maximum number of records to return (for pagination)
+            skip: Number of records to skip (for pagination)
+            projection: Optional projection limiting the returned fields (e.g. Cattle.LIST_FIELDS)
         """
         feedlot_db = get_feedlot_db(feedlot_code)
         query = {'batch_id': ObjectId(batch_id)}
         if not include_deleted:
             query['deleted_at'] = None
-        return list(feedlot_db.cattle.find(query))
+        cursor = feedlot_db.cattle.find(query, projection)
+        if limit:
+            # Pages need a stable order
+            cursor = cursor.sort([('cattle_id', 1), ('_id', 1)])
+            if skip > 0:
+                cursor = cursor.skip(skip)
+            cursor = cursor.limit(limit)
+        return list(cursor)
     
     @staticmethod
-    def find_by_pen(feedlot_code, pen_id, include_deleted=False):
+    def find_by_pen(feedlot_code, pen_id, include_deleted=False, limit=None, skip=0, projection=None):
         """Find all cattle in a pen
         
         Args:
             feedlot_code: The feedlot code (required for database selection)
             pen_id: The pen ID
             include_deleted: If True, include soft-deleted cattle. Defaults to False.
+            limit: Optional maximum number of records to return (for pagination)
+            skip: Number of records to skip (for pagination)
+            projection: Optional projection limiting the returned fields (e.g. Cattle.LIST_FIELDS)
         """
         feedlot_db = get_feedlot_db(feedlot_code)
         query = {'pen_id': ObjectId(pen_id), 'status': 'active'}
         if not include_deleted:
             query['deleted_at'] = None
-        return list(feedlot_db.cattle.find(query))
+        cursor = feedlot_db.cattle.find(query, projection)
+        if limit:
+            # Pages need a stable order
+            cursor = cursor.sort([('cattle_id', 1), ('_id', 1)])
+            if skip > 0:
+                cursor = cursor.skip(skip)
+            cursor = cursor.limit(limit)
+        return list(cursor)
     
     @staticmethod
     def update_cattle(feedlot_code, cattle_record_id, update_data, updated_by='system'):
@@ -232,6 +308,7 @@ class Cattle:
             {'_id': ObjectId(cattle_record_id)},
             {'$set': update_data}
         )
+        Feedlot.invalidate_statistics_cache(cattle.get('feedlot_id'))
         
         # Add audit log entry if there were changes
         if changes:
@@ -265,27 +342,30 @@ class Cattle:
         old_pen_name = old_pen.get('pen_number', str(old_pen_id)) if old_pen else None
         new_pen_name = new_pen.get('pen_number', str(new_pen_id)) if new_pen else None
         
-        feedlot_db = get_feedlot_db(feedlot_code)
-        feedlot_db.cattle.update_one(
-            {'_id': ObjectId(cattle_record_id)},
-            {'$set': {
-                'pen_id': ObjectId(new_pen_id) if new_pen_id else None,
-                'updated_at': datetime.utcnow()
-            }}
-        )
-        
-        # Add audit log entry for pen movement
+        # Audit log entry for pen movement, written in the same update as the move
         description = f'Moved to pen {new_pen_name}' if new_pen_name else 'Removed from pen'
         if old_pen_name:
             description = f'Moved from pen {old_pen_name} to pen {new_pen_name}' if new_pen_name else f'Removed from pen {old_pen_name}'
-        Cattle.add_audit_log_entry(
-            feedlot_code,
-            cattle_record_id, 
+        audit_entry = Cattle.build_audit_log_entry(
             'pen_moved', 
             description, 
             moved_by,
             {'old_pen_id': str(old_pen_id) if old_pen_id else None, 'new_pen_id': str(new_pen_id) if new_pen_id else None, 'old_pen_name': old_pen_name, 'new_pen_name': new_pen_name}
         )
+        
+        feedlot_db = get_feedlot_db(feedlot_code)
+        feedlot_db.cattle.update_one(
+            {'_id': ObjectId(cattle_record_id)},
+            {
+                '$set': {
+                    'pen_id': ObjectId(new_pen_id) if new_pen_id else None,
+                    'updated_at': datetime.utcnow()
+                },
+                '$push': {'audit_log': audit_entry}
+            }
+        )
+        # Pen occupancy changed (statistics for every feedlot are dropped if the record wasn't found)
+        Feedlot.invalidate_statistics_cache(cattle.get('feedlot_id') if cattle else None)
     
     @staticmethod
     def remove_cattle(feedlot_code, cattle_record_id, removed_by='system'):
@@ -296,24 +376,25 @@ class Cattle:
             cattle_record_id: The cattle record ID
             removed_by: User who removed the cattle
         """
-        feedlot_db = get_feedlot_db(feedlot_code)
-        feedlot_db.cattle.update_one(
-            {'_id': ObjectId(cattle_record_id)},
-            {'$set': {
-                'status': 'removed',
-                'updated_at': datetime.utcnow()
-            }}
-        )
-        
-        # Add audit log entry for removal
-        Cattle.add_audit_log_entry(
-            feedlot_code,
-            cattle_record_id,
+        # Audit log entry for removal, written in the same update
+        audit_entry = Cattle.build_audit_log_entry(
             'removed',
             'Cattle record marked as removed',
             removed_by,
             {'status': 'removed'}
         )
+        
+        feedlot_db = get_feedlot_db(feedlot_code)
+        feedlot_db.cattle.update_one(
+            {'_id': ObjectId(cattle_record_id)},
+            {
+                '$set': {
+                    'status': 'removed',
+                    'updated_at': datetime.utcnow()
+                },
+                '$push': {'audit_log': audit_entry}
+            }
+        )
     
     @staticmethod
     def delete_cattle(feedlot_code, cattle_record_id, deleted_by='system'):
@@ -324,24 +405,29 @@ class Cattle:
             cattle_record_id: The cattle record ID
             deleted_by: User who deleted the cattle
         """
-        feedlot_db = get_feedlot_db(feedlot_code)
-        feedlot_db.cattle.update_one(
-            {'_id': ObjectId(cattle_record_id)},
-            {'$set': {
-                'deleted_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
-            }}
-        )
+        deleted_at = datetime.utcnow()
         
-        # Add audit log entry for deletion
-        Cattle.add_audit_log_entry(
-            feedlot_code,
-            cattle_record_id,
+        # Audit log entry for deletion, written in the same update
+        audit_entry = Cattle.build_audit_log_entry(
             'deleted',
             'Cattle record soft deleted',
             deleted_by,
-            {'deleted_at': datetime.utcnow().isoformat()}
+            {'deleted_at': deleted_at.isoformat()}
         )
+        
+        feedlot_db = get_feedlot_db(feedlot_code)
+        feedlot_db.cattle.update_one(
+            {'_id': ObjectId(cattle_record_id)},
+            {
+                '$set': {
+                    'deleted_at': deleted_at,
+                    'updated_at': deleted_at
+                },
+                '$push': {'audit_log': audit_entry}
+            }
+        )
+        # The cattle's feedlot ID isn't known here, so drop all cached statistics
+        Feedlot.invalidate_statistics_cache()
     
     @staticmethod
     def add_weight_record(feedlot_code, cattle_record_id, weight, recorded_by='system'):
@@ -362,6 +448,17 @@ class Cattle:
             'recorded_by': recorded_by
         }
         
+        # Audit log entry for weight addition, written in the same update
+        description = f'Weight recorded: {weight} kg'
+        if previous_weight:
+            description += f' (previous: {previous_weight} kg)'
+        audit_entry = Cattle.build_audit_log_entry(
+            'weight_recorded', 
+            description, 
+            recorded_by,
+            {'weight': weight, 'previous_weight': previous_weight}
+        )
+        
         feedlot_db = get_feedlot_db(feedlot_code)
         feedlot_db.cattle.update_one(
             {'_id': ObjectId(cattle_record_id)},
@@ -370,22 +467,9 @@ class Cattle:
                     'weight': weight,  # Update current weight
                     'updated_at': datetime.utcnow()
                 },
-                '$push': {'weight_history': weight_record}
+                '$push': {'weight_history': weight_record, 'audit_log': audit_entry}
             }
         )
-        
-        # Add audit log entry for weight addition
-        description = f'Weight recorded: {weight} kg'
-        if previous_weight:
-            description += f' (previous: {previous_weight} kg)'
-        Cattle.add_audit_log_entry(
-            feedlot_code,
-            cattle_record_id, 
-            'weight_recorded', 
-            description, 
-            recorded_by,
-            {'weight': weight, 'previous_weight': previous_weight}
-        )
     
     @staticmethod
     def get_weight_history(feedlot_code, cattle_record_id):
@@ -433,6 +517,15 @@ class Cattle:
             'recorded_by': recorded_by
         }
         
+        # Audit log entry for note addition, written in the same update
+        description = f'Note added: {note[:50]}{"..." if len(note) > 50 else ""}'
+        audit_entry = Cattle.build_audit_log_entry(
+            'note_added', 
+            description, 
+            recorded_by,
+            {'note': note}
+        )
+        
         feedlot_db = get_feedlot_db(feedlot_code)
         feedlot_db.cattle.update_one(
             {'_id': ObjectId(cattle_record_id)},
@@ -440,20 +533,9 @@ class Cattle:
                 '$set': {
                     'updated_at': datetime.utcnow()
                 },
-                '$push': {'notes_history': note_record}
+                '$push': {'notes_history': note_record, 'audit_log': audit_entry}
             }
         )
-        
-        # Add audit log entry for note addition
-        description = f'Note added: {note[:50]}{"..." if len(note) > 50 else ""}'
-        Cattle.add_audit_log_entry(
-            feedlot_code,
-            cattle_record_id, 
-            'note_added', 
-            description, 
-            recorded_by,
-            {'note': note}
-        )
     
     @staticmethod
     def get_notes_history(feedlot_code, cattle_record_id):
@@ -485,21 +567,8 @@ class Cattle:
         return cattle.get('movement_history', [])
     
     @staticmethod
-    def find_by_feedlot_with_filters(feedlot_code, feedlot_id, search=None, cattle_status=None, sex=None, pen_id=None, sort_by='cattle_id', sort_order='asc', include_deleted=False):
-        """Find cattle with filtering and sorting
-        
-        Args:
-            feedlot_code: The feedlot code (required for database selection)
-            feedlot_id: The feedlot ID
-            search: Optional search term for cattle_id
-            cattle_status: Optional cattle status filter
-            sex: Optional sex filter
-            pen_id: Optional pen ID filter
-            sort_by: Field to sort by
-            sort_order: Sort order ('asc' or 'desc')
-            include_deleted: If True, include soft-deleted cattle. Defaults to False.
-        """
-        feedlot_db = get_feedlot_db(feedlot_code)
+    def _filter_query(feedlot_id, search=None, cattle_status=None, sex=None, pen_id=None, include_deleted=False):
+        """Build the cattle list query shared by find_by_feedlot_with_filters and count_with_filters"""
         query = {'feedlot_id': ObjectId(feedlot_id)}
         
         # Exclude soft-deleted records by default
@@ -508,7 +577,8 @@ class Cattle:
         
         # Add search filter for cattle_id
         if search:
-            query['cattle_id'] = {'$regex': search, '$options': 'i'}
+            # Escape the term so it is matched literally, not as a user-supplied regex
+            query['cattle_id'] = {'$regex': re.escape(search), '$options': 'i'}
         
         # Add cattle status filter
         if cattle_status:
@@ -522,6 +592,11 @@ class Cattle:
         if pen_id:
             query['pen_id'] = ObjectId(pen_id)
         
+        return query
+    
+    @staticmethod
+    def _sort_criteria(sort_by='cattle_id', sort_order='asc'):
+        """Build the cattle list sort as a list of (field, direction) pairs"""
         # Define sort order
         sort_direction = 1 if sort_order == 'asc' else -1
         
@@ -535,9 +610,107 @@ class Cattle:
         }
         
         sort_field = sort_field_map.get(sort_by, 'cattle_id')
-        sort_criteria = [(sort_field, sort_direction)]
+        # Tie-break on _id so pages don't overlap when the sort field has duplicates
+        return [(sort_field, sort_direction), ('_id', sort_direction)]
+    
+    @staticmethod
+    def find_by_feedlot_with_filters(feedlot_code, feedlot_id, search=None, cattle_status=None, sex=None, pen_id=None, sort_by='cattle_id', sort_order='asc', include_deleted=False, projection=None, limit=None, skip=0):
+        """Find cattle with filtering and sorting
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            feedlot_id: The feedlot ID
+            search: Optional search term for cattle_id
+            cattle_status: Optional cattle status filter
+            sex: Optional sex filter
+            pen_id: Optional pen ID filter
+            sort_by: Field to sort by
+            sort_order: Sort order ('asc' or 'desc')
+            include_deleted: If True, include soft-deleted cattle. Defaults to False.
+            projection: Optional projection limiting the returned fields (e.g. Cattle.LIST_FIELDS)
+            limit: Optional maximum number of records to return (for pagination)
+            skip: Number of records to skip (for pagination)
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        query = Cattle._filter_query(feedlot_id, search, cattle_status, sex, pen_id, include_deleted)
+        
+        sort_criteria = Cattle._sort_criteria(sort_by, sort_order)
         
-        return list(feedlot_db.cattle.find(query).sort(sort_criteria))
+        cursor = feedlot_db.cattle.find(query, projection).sort(sort_criteria)
+        if skip > 0:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+    
+    @staticmethod
+    def find_list_page(feedlot_code, feedlot_id, search=None, cattle_status=None, sex=None, pen_id=None, sort_by='cattle_id', sort_order='asc', include_deleted=False, projection=None, limit=50, skip=0):
+        """Get everything the cattle list view needs in a single $facet aggregation
+        
+        One round-trip returns the requested page, totals over every matching record
+        (not just the page) and the feedlot's distinct status/sex values for the
+        filter dropdowns. The dropdown facets ignore the user's filters so all
+        options stay selectable.
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            feedlot_id: The feedlot ID
+            search: Optional search term for cattle_id
+            cattle_status: Optional cattle status filter
+            sex: Optional sex filter
+            pen_id: Optional pen ID filter
+            sort_by: Field to sort by
+            sort_order: Sort order ('asc' or 'desc')
+            include_deleted: If True, include soft-deleted cattle. Defaults to False.
+            projection: Optional projection limiting the returned fields (e.g. Cattle.LIST_FIELDS)
+            limit: Maximum number of records in the page. Defaults to 50.
+            skip: Number of records to skip
+        
+        Returns:
+            Dictionary with 'cattle' (the page), 'total_count', 'status_counts'
+            ({cattle_status: count}), 'avg_weight', 'cattle_statuses' and 'sexes'
+        """
+        feedlot_db = get_feedlot_db(feedlot_code)
+        base_query = Cattle._filter_query(feedlot_id, include_deleted=include_deleted)
+        query = Cattle._filter_query(feedlot_id, search, cattle_status, sex, pen_id, include_deleted)
+        filter_match = {'$match': {k: v for k, v in query.items() if k not in base_query}}
+        
+        rows = [filter_match, {'$sort': dict(Cattle._sort_criteria(sort_by, sort_order))}]
+        if skip > 0:
+            rows.append({'$skip': skip})
+        rows.append({'$limit': limit})
+        if projection:
+            rows.append({'$project': projection})
+        
+        pipeline = [
+            {'$match': base_query},
+            {'$facet': {
+                'rows': rows,
+                'summary': [
+                    filter_match,
+                    {'$group': {
+                        '_id': '$cattle_status',
+                        'count': {'$sum': 1},
+                        'weight_sum': {'$sum': '$weight'}
+                    }}
+                ],
+                'cattle_statuses': [{'$group': {'_id': '$cattle_status'}}],
+                'sexes': [{'$group': {'_id': '$sex'}}]
+            }}
+        ]
+        result = next(feedlot_db.cattle.aggregate(pipeline))
+        
+        summary = result['summary']
+        total_count = sum(row['count'] for row in summary)
+        weight_sum = sum(row['weight_sum'] for row in summary)
+        return {
+            'cattle': result['rows'],
+            'total_count': total_count,
+            'status_counts': {row['_id']: row['count'] for row in summary},
+            'avg_weight': weight_sum / total_count if total_count else 0,
+            'cattle_statuses': [row['_id'] for row in result['cattle_statuses'] if row['_id']],
+            'sexes': [row['_id'] for row in result['sexes'] if row['_id']]
+        }
     
     @staticmethod
     def update_tag_pair(feedlot_code, cattle_record_id, new_lf_tag, new_uhf_tag, updated_by='system', reason=None):
@@ -664,18 +837,30 @@ class Cattle:
             details: Optional additional details
         """
         feedlot_db = get_feedlot_db(feedlot_code)
-        audit_entry = {
+        audit_entry = Cattle.build_audit_log_entry(activity_type, description, performed_by, details)
+        
+        feedlot_db.cattle.update_one(
+            {'_id': ObjectId(cattle_record_id)},
+            {'$push': {'audit_log': audit_entry}}
+        )
+    
+    @staticmethod
+    def build_audit_log_entry(activity_type, description, performed_by='system', details=None):
+        """Build an audit log entry, for pushing onto audit_log in the same update as the change it records
+        
+        Args:
+            activity_type: Type of activity
+            description: Description of the activity
+            performed_by: User who performed the activity
+            details: Optional additional details
+        """
+        return {
             'activity_type': activity_type,
             'description': description,
             'performed_by': performed_by,
             'timestamp': datetime.utcnow(),
             'details': details or {}
         }
-        
-        feedlot_db.cattle.update_one(
-            {'_id': ObjectId(cattle_record_id)},
-            {'$push': {'audit_log': audit_entry}}
-        )
     
     @staticmethod
     def get_audit_log(feedlot_code, cattle_record_id):
@@ -1,6 +1,15 @@
 from datetime import datetime
 from bson import ObjectId
 from app import db, get_feedlot_db
+import time
+
+# Process-level cache for Feedlot.find_all_cached()
+FIND_ALL_CACHE_TTL = 30  # seconds
+_find_all_cache = {'timestamp': 0.0, 'feedlots': None}
+
+# Process-level cache for Feedlot.get_statistics_cached(), keyed by feedlot ID
+STATISTICS_CACHE_TTL = 30  # seconds
+_statistics_cache = {}  # feedlot_id -> (timestamp, statistics)
 
 class Feedlot:
     @staticmethod
@@ -56,12 +65,18 @@ class Feedlot:
         # Batches collection
         feedlot_db.batches.create_index('feedlot_id')
         feedlot_db.batches.create_index([('feedlot_id', 1), ('batch_number', 1)], unique=True)
+        feedlot_db.batches.create_index([('feedlot_id', 1), ('event_date', -1), ('_id', -1)])
+        feedlot_db.batches.create_index([('feedlot_id', 1), ('event_type', 1)])
         
         # Cattle collection
         feedlot_db.cattle.create_index('feedlot_id')
         feedlot_db.cattle.create_index('batch_id')
         feedlot_db.cattle.create_index('pen_id')
         feedlot_db.cattle.create_index([('feedlot_id', 1), ('cattle_id', 1)], unique=True)
+        # List view filters/dropdowns and per-pen active counts
+        feedlot_db.cattle.create_index([('feedlot_id', 1), ('cattle_status', 1)])
+        feedlot_db.cattle.create_index([('feedlot_id', 1), ('sex', 1)])
+        feedlot_db.cattle.create_index([('pen_id', 1), ('status', 1)])
         
         # Manifest templates collection
         feedlot_db.manifest_templates.create_index('feedlot_id')
@@ -108,6 +123,7 @@ class Feedlot:
         
         result = db.feedlots.insert_one(feedlot_data)
         feedlot_id = str(result.inserted_id)
+        Feedlot.invalidate_cache()
         
         # Initialize feedlot-specific database
         try:
@@ -143,6 +159,28 @@ class Feedlot:
             query['deleted_at'] = None
         return list(db.feedlots.find(query))
     
+    @staticmethod
+    def find_all_cached(ttl=FIND_ALL_CACHE_TTL):
+        """Find all feedlots, reusing a result cached for up to ttl seconds
+        
+        Intended for read-only uses such as populating form dropdowns. The cache
+        is cleared whenever a feedlot is written through this model.
+        
+        Args:
+            ttl: Maximum age of the cached result in seconds
+        """
+        now = time.monotonic()
+        if _find_all_cache['feedlots'] is None or now - _find_all_cache['timestamp'] > ttl:
+            _find_all_cache['feedlots'] = Feedlot.find_all()
+            _find_all_cache['timestamp'] = now
+        return _find_all_cache['feedlots']
+    
+    @staticmethod
+    def invalidate_cache():
+        """Clear the cached result of find_all_cached()"""
+        _find_all_cache['feedlots'] = None
+        _find_all_cache['timestamp'] = 0.0
+    
     @staticmethod
     def find_by_ids(feedlot_ids, include_deleted=False):
         """Find feedlots by a list of IDs
@@ -181,6 +219,7 @@ class Feedlot:
             {'_id': ObjectId(feedlot_id)},
             {'$set': update_data}
         )
+        Feedlot.invalidate_cache()
     
     @staticmethod
     def get_statistics(feedlot_id):
@@ -224,6 +263,40 @@ class Feedlot:
             'cattle_by_pen': len(cattle_by_pen)
         }
     
+    @staticmethod
+    def get_statistics_cached(feedlot_id, ttl=STATISTICS_CACHE_TTL):
+        """Get feedlot statistics, reusing a result cached for up to ttl seconds
+        
+        If recomputing fails (e.g. the database is unavailable) the last good
+        result is returned instead, however old it is.
+        
+        Args:
+            feedlot_id: The feedlot ID
+            ttl: Maximum age of the cached result in seconds
+        """
+        key = str(feedlot_id)
+        now = time.monotonic()
+        cached = _statistics_cache.get(key)
+        if cached is not None and now - cached[0] <= ttl:
+            return cached[1]
+        
+        try:
+            statistics = Feedlot.get_statistics(feedlot_id)
+        except Exception:
+            if cached is not None:
+                return cached[1]
+            raise
+        _statistics_cache[key] = (now, statistics)
+        return statistics
+    
+    @staticmethod
+    def invalidate_statistics_cache(feedlot_id=None):
+        """Clear cached statistics for one feedlot, or for all feedlots if feedlot_id is None"""
+        if feedlot_id is None:
+            _statistics_cache.clear()
+        else:
+            _statistics_cache.pop(str(feedlot_id), None)
+    
     @staticmethod
     def save_pen_map(feedlot_id, grid_width, grid_height, pen_placements):
         """Save pen map configuration for a feedlot"""
@@ -238,6 +311,7 @@ class Feedlot:
             {'_id': ObjectId(feedlot_id)},
             {'$set': {'pen_map': pen_map_data, 'updated_at': datetime.utcnow()}}
         )
+        Feedlot.invalidate_cache()
     
     @staticmethod
     def get_pen_map(feedlot_id):
@@ -277,6 +351,7 @@ class Feedlot:
             {'_id': ObjectId(feedlot_id)},
             {'$set': update_data}
         )
+        Feedlot.invalidate_cache()
     
     @staticmethod
     def get_branding(feedlot_id):
@@ -350,4 +425,6 @@ class Feedlot:
                 'updated_at': datetime.utcnow()
             }}
         )
+        Feedlot.invalidate_cache()
+        Feedlot.invalidate_statistics_cache(feedlot_id)
 
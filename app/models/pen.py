@@ -1,6 +1,12 @@
 from datetime import datetime
 from bson import ObjectId
 from app import db, get_feedlot_db
+from app.models.feedlot import Feedlot
+import time
+
+# Process-level cache for Pen.find_by_feedlot_cached(), keyed by feedlot ID
+PENS_CACHE_TTL = 10  # seconds
+_pens_cache = {}  # feedlot_id -> (timestamp, pens, pens_by_id)
 
 class Pen:
     @staticmethod
@@ -16,6 +22,8 @@ class Pen:
         }
         
         result = db.pens.insert_one(pen_data)
+        Pen.invalidate_cache(feedlot_id)
+        Feedlot.invalidate_statistics_cache(feedlot_id)
         return str(result.inserted_id)
     
     @staticmethod
@@ -44,6 +52,49 @@ class Pen:
             query['deleted_at'] = None
         return list(db.pens.find(query))
     
+    @staticmethod
+    def find_by_feedlot_cached(feedlot_id, ttl=PENS_CACHE_TTL):
+        """Find all (non-deleted) pens for a feedlot, reusing a result cached for up to ttl seconds
+        
+        Intended for read-only uses such as populating pen dropdowns. The cache
+        is cleared whenever a pen is written through this model.
+        
+        Args:
+            feedlot_id: The feedlot ID
+            ttl: Maximum age of the cached result in seconds
+        """
+        return Pen._get_cached_entry(feedlot_id, ttl)[1]
+    
+    @staticmethod
+    def find_lookup_cached(feedlot_id, ttl=PENS_CACHE_TTL):
+        """Get a {pen_id string: pen} lookup for a feedlot's pens, cached with the pen list
+        
+        Args:
+            feedlot_id: The feedlot ID
+            ttl: Maximum age of the cached result in seconds
+        """
+        return Pen._get_cached_entry(feedlot_id, ttl)[2]
+    
+    @staticmethod
+    def _get_cached_entry(feedlot_id, ttl):
+        """Get (timestamp, pens, pens_by_id) for a feedlot, refreshing it if older than ttl"""
+        key = str(feedlot_id)
+        now = time.monotonic()
+        cached = _pens_cache.get(key)
+        if cached is None or now - cached[0] > ttl:
+            pens = Pen.find_by_feedlot(feedlot_id)
+            cached = (now, pens, {str(pen['_id']): pen for pen in pens})
+            _pens_cache[key] = cached
+        return cached
+    
+    @staticmethod
+    def invalidate_cache(feedlot_id=None):
+        """Clear cached pen lists for one feedlot, or for all feedlots if feedlot_id is None"""
+        if feedlot_id is None:
+            _pens_cache.clear()
+        else:
+            _pens_cache.pop(str(feedlot_id), None)
+    
     @staticmethod
     def update_pen(pen_id, update_data):
         """Update pen information"""
@@ -52,6 +103,9 @@ class Pen:
             {'_id': ObjectId(pen_id)},
             {'$set': update_data}
         )
+        # The pen's feedlot isn't known here, so drop all cached pen lists and statistics
+        Pen.invalidate_cache()
+        Feedlot.invalidate_statistics_cache()
     
     @staticmethod
     def delete_pen(pen_id):
@@ -67,6 +121,8 @@ class Pen:
                 'updated_at': datetime.utcnow()
             }}
         )
+        Pen.invalidate_cache()
+        Feedlot.invalidate_statistics_cache()
     
     @staticmethod
     def get_current_cattle_count(pen_id, feedlot_code):
@@ -87,15 +143,60 @@ class Pen:
         })
     
     @staticmethod
-    def is_capacity_available(pen_id, feedlot_code, additional_cattle=1):
+    def get_cattle_counts(feedlot_code, pen_ids):
+        """Get current number of cattle in each of several pens with one aggregation
+        
+        Args:
+            feedlot_code: The feedlot code (required for database selection)
+            pen_ids: Iterable of pen IDs
+        
+        Returns:
+            Dictionary mapping pen ObjectId to its active cattle count (pens with no cattle are omitted)
+        """
+        if not feedlot_code:
+            return {}
+        
+        feedlot_db = get_feedlot_db(feedlot_code)
+        pipeline = [
+            {'$match': {
+                'pen_id': {'$in': [ObjectId(pen_id) for pen_id in pen_ids]},
+                'status': 'active',
+                'deleted_at': None
+            }},
+            {'$group': {'_id': '$pen_id', 'count': {'$sum': 1}}}
+        ]
+        return {row['_id']: row['count'] for row in feedlot_db.cattle.aggregate(pipeline)}
+    
+    @staticmethod
+    def find_by_feedlot_with_counts(feedlot_id, feedlot_code, include_deleted=False):
+        """Find all pens for a feedlot with each pen's current cattle count in 'current_count'
+        
+        Pens live in the master database and cattle in the feedlot database, so the
+        counts come from a single $group over cattle rather than a query per pen.
+        
+        Args:
+            feedlot_id: The feedlot ID
+            feedlot_code: The feedlot code (required for database selection)
+            include_deleted: If True, include soft-deleted pens. Defaults to False.
+        """
+        pens = Pen.find_by_feedlot(feedlot_id, include_deleted=include_deleted)
+        counts = Pen.get_cattle_counts(feedlot_code, [pen['_id'] for pen in pens])
+        for pen in pens:
+            pen['current_count'] = counts.get(pen['_id'], 0)
+        return pens
+    
+    @staticmethod
+    def is_capacity_available(pen_id, feedlot_code, additional_cattle=1, pen=None):
         """Check if pen has available capacity
         
         Args:
             pen_id: The pen ID
             feedlot_code: The feedlot code (required for database selection)
             additional_cattle: Number of additional cattle to check capacity for (default: 1)
+            pen: Optional already-loaded pen document (e.g. from find_lookup_cached); looked up if not given
         """
-        pen = Pen.find_by_id(pen_id)
+        if pen is None:
+            pen = Pen.find_by_id(pen_id)
         if not pen or pen.get('deleted_at'):
             return False
         
@@ -1,9 +1,34 @@
 from datetime import datetime
+from collections import OrderedDict
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app import db
+from config import Config
 import bcrypt
+import hashlib
+import threading
+
+# In-process cache of successful password verifications, enabled with
+# USE_VERIFY_PASSWORD_CACHE. Keys are (password_hash, sha256(password)) so the
+# plain text password is never kept in memory.
+VERIFY_PASSWORD_CACHE_SIZE = 1024
+_verify_password_cache = OrderedDict()
+_verify_password_cache_lock = threading.Lock()  # Guards the cache under threaded workers
 
 class User:
+    # Fields needed to authenticate a user and populate their session at login
+    LOGIN_FIELDS = {
+        'username': 1,
+        'password_hash': 1,
+        'user_type': 1,
+        'is_active': 1,
+        'feedlot_id': 1,
+        'feedlot_ids': 1,
+        'first_name': 1,
+        'last_name': 1,
+        'profile_picture': 1,
+    }
+    
     @staticmethod
     def create_user(username, email, password, user_type, feedlot_id=None, feedlot_ids=None):
         """Create a new user
@@ -16,7 +41,7 @@ class User:
             feedlot_id: Single feedlot ID (for 'user' type)
             feedlot_ids: List of feedlot IDs (for 'business_admin' or 'business_owner' users)
         """
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = User.hash_password(password)
         
         user_data = {
             'username': username,
@@ -42,20 +67,72 @@ class User:
         return str(result.inserted_id)
     
     @staticmethod
-    def find_by_username(username):
-        """Find user by username"""
-        return db.users.find_one({'username': username})
+    def find_by_username(username, projection=None):
+        """Find user by username
+        
+        Args:
+            username: Username to look up (served by the unique username index)
+            projection: Optional projection limiting the returned fields
+        """
+        return db.users.find_one({'username': username}, projection)
     
     @staticmethod
-    def find_by_email(email):
-        """Find user by email"""
-        return db.users.find_one({'email': email})
+    def find_by_email(email, projection=None):
+        """Find user by email
+        
+        Args:
+            email: Email address to look up (served by the unique email index)
+            projection: Optional projection limiting the returned fields
+        """
+        return db.users.find_one({'email': email}, projection)
+    
+    @staticmethod
+    def find_by_username_or_email(username, email):
+        """Find a user matching either the username or the email in a single query
+        
+        Returns only the username and email fields, which is enough to tell
+        which of the two values is already taken.
+        """
+        return db.users.find_one(
+            {'$or': [{'username': username}, {'email': email}]},
+            {'username': 1, 'email': 1}
+        )
+    
+    @staticmethod
+    def find_duplicate(username, email, exclude_id):
+        """Find another user already using the username or email, in a single query
+        
+        Args:
+            username: Username to check (None to skip)
+            email: Email to check (None to skip)
+            exclude_id: ID of the user being updated, excluded from the match
+        
+        Returns only the username and email fields, or None if neither is taken.
+        """
+        conditions = []
+        if username is not None:
+            conditions.append({'username': username})
+        if email is not None:
+            conditions.append({'email': email})
+        if not conditions:
+            return None
+        return db.users.find_one(
+            {'$or': conditions, '_id': {'$ne': ObjectId(exclude_id)}},
+            {'username': 1, 'email': 1}
+        )
     
     @staticmethod
     def find_by_id(user_id):
         """Find user by ID"""
         return db.users.find_one({'_id': ObjectId(user_id)})
     
+    @staticmethod
+    def hash_password(password):
+        """Hash a password with bcrypt using the configured cost factor (BCRYPT_ROUNDS)"""
+        if isinstance(password, str):
+            password = password.encode('utf-8')
+        return bcrypt.hashpw(password, bcrypt.gensalt(Config.BCRYPT_ROUNDS))
+    
     @staticmethod
     def verify_password(stored_password, provided_password):
         """Verify user password"""
@@ -63,7 +140,30 @@ class User:
             stored_password = stored_password.encode('utf-8')
         if isinstance(provided_password, str):
             provided_password = provided_password.encode('utf-8')
-        return bcrypt.checkpw(provided_password, stored_password)
+        if not Config.USE_VERIFY_PASSWORD_CACHE:
+            return bcrypt.checkpw(provided_password, stored_password)
+        
+        cache_key = (stored_password, hashlib.sha256(provided_password).digest())
+        with _verify_password_cache_lock:
+            if cache_key in _verify_password_cache:
+                _verify_password_cache.move_to_end(cache_key)
+                return True
+        
+        # Only successful checks are cached so failed attempts still pay the full bcrypt cost.
+        # The lock isn't held during bcrypt so other logins aren't serialized behind it.
+        if not bcrypt.checkpw(provided_password, stored_password):
+            return False
+        with _verify_password_cache_lock:
+            _verify_password_cache[cache_key] = True
+            if len(_verify_password_cache) > VERIFY_PASSWORD_CACHE_SIZE:
+                _verify_password_cache.popitem(last=False)
+        return True
+    
+    @staticmethod
+    def clear_verify_password_cache():
+        """Drop cached password verifications (call after a password change)"""
+        with _verify_password_cache_lock:
+            _verify_password_cache.clear()
     
     @staticmethod
     def find_by_feedlot(feedlot_id):
@@ -88,12 +188,31 @@ class User:
         return list(db.users.find({'user_type': 'business_owner', 'is_active': True}))
     
     @staticmethod
-    def update_user(user_id, update_data):
-        """Update user information"""
-        db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': update_data}
-        )
+    def update_user(user_id, update_data, return_doc=False):
+        """Update user information
+        
+        Args:
+            user_id: User ID
+            update_data: Fields to set
+            return_doc: If True, return the updated profile fields
+                (first_name, last_name, profile_picture) from the same round trip
+        """
+        if return_doc:
+            updated_user = db.users.find_one_and_update(
+                {'_id': ObjectId(user_id)},
+                {'$set': update_data},
+                projection={'first_name': 1, 'last_name': 1, 'profile_picture': 1},
+                return_document=ReturnDocument.AFTER
+            )
+        else:
+            updated_user = None
+            db.users.update_one(
+                {'_id': ObjectId(user_id)},
+                {'$set': update_data}
+            )
+        if 'password_hash' in update_data:
+            User.clear_verify_password_cache()
+        return updated_user
     
     @staticmethod
     def deactivate_user(user_id):
@@ -1,131 +1,286 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app, g
 from app.models.user import User
 from app.models.feedlot import Feedlot
 from functools import wraps
-import bcrypt
 import os
-import uuid
+import secrets
+import time
+import threading
+from types import SimpleNamespace
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
 from bson import ObjectId
 
 auth_bp = Blueprint('auth', __name__)
 
+# User type groupings used for role checks
+_SUPER_TYPES = frozenset({'super_owner', 'super_admin'})
+_BUSINESS_TYPES = frozenset({'business_owner', 'business_admin'})
+_ADMIN_TYPES = _SUPER_TYPES | _BUSINESS_TYPES
+_VALID_TYPES = _ADMIN_TYPES | {'user'}
+
+# Human-readable user type names for messages
+_USER_TYPE_DISPLAY = {user_type: user_type.replace('_', ' ') for user_type in _VALID_TYPES}
+
+# Failed login tracking, used to reject brute-force attempts before any
+# database lookup or password hashing happens
+LOGIN_MAX_FAILURES = 5
+LOGIN_LOCKOUT_SECONDS = 30
+LOGIN_FAILURES_MAX_ENTRIES = 10000
+# Ordered oldest failure first, so expired entries can be dropped from the front
+_login_failures = OrderedDict()  # (remote_addr, username) -> (failure_count, last_failure_time)
+_login_failures_lock = threading.Lock()  # Guards _login_failures under threaded workers
+
+def _login_throttled(username):
+    """Check if too many recent failed logins were made for this client and username"""
+    with _login_failures_lock:
+        entry = _login_failures.get((request.remote_addr, username))
+    if not entry:
+        return False
+    failures, last_failure = entry
+    if time.monotonic() - last_failure > LOGIN_LOCKOUT_SECONDS:
+        return False
+    return failures >= LOGIN_MAX_FAILURES
+
+def _record_login_failure(username):
+    """Record a failed login for this client and username"""
+    key = (request.remote_addr, username)
+    with _login_failures_lock:
+        now = time.monotonic()
+        failures, last_failure = _login_failures.pop(key, (0, now))
+        if now - last_failure > LOGIN_LOCKOUT_SECONDS:
+            failures = 0
+        _login_failures[key] = (failures + 1, now)
+        
+        # Drop entries whose lockout has already ended, and bound the size regardless
+        while _login_failures:
+            oldest_time = next(iter(_login_failures.values()))[1]
+            if now - oldest_time <= LOGIN_LOCKOUT_SECONDS and len(_login_failures) <= LOGIN_FAILURES_MAX_ENTRIES:
+                break
+            _login_failures.popitem(last=False)
+
+def _clear_login_failures(username):
+    """Forget failed logins for this client and username after a successful login"""
+    with _login_failures_lock:
+        _login_failures.pop((request.remote_addr, username), None)
+
+# Hash checked when a login names an unknown user, so that unknown usernames
+# cost the same bcrypt work as wrong passwords (created on first use)
+_dummy_password_hash = None
+
+def _verify_login_password(user, password):
+    """Verify a login password, doing equivalent bcrypt work when user is None"""
+    global _dummy_password_hash
+    password = password or ''
+    if user is None:
+        if _dummy_password_hash is None:
+            _dummy_password_hash = User.hash_password(b'herdlinx-dummy-password')
+        User.verify_password(_dummy_password_hash, password)
+        return False
+    return User.verify_password(user['password_hash'], password)
+
+def _cached_find_by_username(username):
+    """Find user by username, memoized for the current request"""
+    cache = g.setdefault('_username_cache', {})
+    if username not in cache:
+        cache[username] = User.find_by_username(username, User.LOGIN_FIELDS)
+    return cache[username]
+
+def _get_authz():
+    """Get the session's authorization fields, resolved once per request
+    
+    The access decorators and register() all read the same few session keys;
+    resolving them here once keeps stacked decorators from repeating the work.
+    """
+    authz = g.get('_authz')
+    if authz is None:
+        authz = SimpleNamespace(
+            user_id=session.get('user_id'),
+            user_type=session.get('user_type'),
+            feedlot_id=session.get('feedlot_id'),
+            # feedlot_ids are stored as strings at login
+            feedlot_ids=frozenset(session.get('feedlot_ids', ())),
+        )
+        g._authz = authz
+    return authz
+
+def get_request_feedlot(feedlot_id):
+    """Get a feedlot by ID, memoized on flask.g for the rest of the request
+    
+    Feedlot routes and the navigation context processor both need the current
+    feedlot; this lets them share a single query.
+    
+    Args:
+        feedlot_id: The feedlot ID
+    """
+    feedlot = g.get('feedlot')
+    if feedlot is None or str(feedlot['_id']) != str(feedlot_id):
+        feedlot = Feedlot.find_by_id(feedlot_id)
+        g.feedlot = feedlot
+    return feedlot
+
+def _cached_url_for(endpoint):
+    """url_for() for endpoints without arguments, memoized for the current request"""
+    cache = g.setdefault('_url_cache', {})
+    if endpoint not in cache:
+        cache[endpoint] = url_for(endpoint)
+    return cache[endpoint]
+
+# Note: the access decorators below only read from the session. Keep them
+# that way so requests passing through them don't trigger a Set-Cookie.
+
 def login_required(f):
     """Decorator to require login"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('auth.login'))
+        if _get_authz().user_id is None:
+            return redirect(_cached_url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
-def super_admin_required(f):
-    """Decorator to require super owner or super admin"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        user_type = session.get('user_type')
-        valid_types = ['super_owner', 'super_admin']
-        if user_type not in valid_types:
-            flash('Access denied. Super owner or super admin access required.', 'error')
-            return redirect(url_for('auth.login'))
-        return f(*args, **kwargs)
-    return decorated_function
+def _user_type_required(allowed_types, denied_message):
+    """Build a decorator that only lets the given user types through
+    
+    Args:
+        allowed_types: frozenset of user types allowed to access the view
+        denied_message: Message flashed when access is denied
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if _get_authz().user_type not in allowed_types:
+                flash(denied_message, 'error')
+                return redirect(_cached_url_for('auth.login'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
 
-def admin_access_required(f):
-    """Decorator to require super owner, super admin, business owner, or business admin"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        user_type = session.get('user_type')
-        valid_types = ['super_owner', 'super_admin', 'business_owner', 'business_admin']
-        if user_type not in valid_types:
-            flash('Access denied. Super owner, super admin, business owner, or business admin access required.', 'error')
-            return redirect(url_for('auth.login'))
-        return f(*args, **kwargs)
-    return decorated_function
+# Decorator to require super owner or super admin
+super_admin_required = _user_type_required(
+    _SUPER_TYPES,
+    'Access denied. Super owner or super admin access required.'
+)
+
+# Decorator to require super owner, super admin, business owner, or business admin
+admin_access_required = _user_type_required(
+    _ADMIN_TYPES,
+    'Access denied. Super owner, super admin, business owner, or business admin access required.'
+)
 
 def feedlot_access_required(feedlot_id_param='feedlot_id'):
     """Decorator to verify user has access to specific feedlot"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user_type = session.get('user_type')
-            user_feedlot_id = session.get('feedlot_id')
-            user_feedlot_ids = session.get('feedlot_ids', [])
-            
-            # Validate user type - reject old/invalid types
-            valid_types = ['super_owner', 'super_admin', 'business_owner', 'business_admin', 'user']
-            if user_type not in valid_types:
-                flash('Invalid user type. Please contact an administrator.', 'error')
-                return redirect(url_for('auth.login'))
+            authz = _get_authz()
+            user_type = authz.user_type
             
             # Super owner and super admin can access any feedlot
-            if user_type in ['super_owner', 'super_admin']:
+            if user_type in _SUPER_TYPES:
                 return f(*args, **kwargs)
             
             feedlot_id = kwargs.get(feedlot_id_param)
             
             # Business owner and business admin users can access their assigned feedlots
-            if user_type in ['business_owner', 'business_admin']:
-                if str(feedlot_id) not in [str(fid) for fid in user_feedlot_ids]:
+            if user_type in _BUSINESS_TYPES:
+                if str(feedlot_id) not in authz.feedlot_ids:
                     flash('Access denied. You do not have access to this feedlot.', 'error')
-                    return redirect(url_for('top_level.dashboard'))
+                    return redirect(_cached_url_for('top_level.dashboard'))
                 return f(*args, **kwargs)
             
             # Regular users can only access their own feedlot
             if user_type == 'user':
-                if str(user_feedlot_id) != str(feedlot_id):
+                # Both are strings: session['feedlot_id'] is stored as str at login
+                # and the feedlot_id URL segment is a string converter
+                user_feedlot_id = authz.feedlot_id
+                if user_feedlot_id != feedlot_id:
                     flash('Access denied.', 'error')
                     return redirect(url_for('feedlot.dashboard', feedlot_id=user_feedlot_id))
                 return f(*args, **kwargs)
             
-            # If we get here, user type is valid but not handled above
-            flash('Access denied.', 'error')
-            return redirect(url_for('auth.login'))
+            # Old/invalid user types fall through to here
+            flash('Invalid user type. Please contact an administrator.', 'error')
+            return redirect(_cached_url_for('auth.login'))
         return decorated_function
     return decorator
 
+def _login_session_data(user):
+    """Build the session fields shared by both login routes"""
+    return {
+        'user_id': str(user['_id']),
+        'username': user['username'],
+        'user_type': user.get('user_type'),
+        # Store user profile data for quick access
+        'user_profile': {
+            'first_name': user.get('first_name'),
+            'last_name': user.get('last_name'),
+            'profile_picture': user.get('profile_picture')
+        },
+    }
+
+def _login_redirect_top_level(user):
+    """Finish login for super owner/admin users"""
+    return redirect(url_for('top_level.dashboard'))
+
+def _login_redirect_business(user):
+    """Finish login for business owner/admin users"""
+    # Store feedlot_ids as a tuple of strings
+    session['feedlot_ids'] = tuple(map(str, user.get('feedlot_ids', ())))
+    return redirect(url_for('top_level.dashboard'))
+
+def _login_redirect_user(user):
+    """Finish login for regular feedlot users"""
+    session['feedlot_id'] = str(user['feedlot_id'])
+    return redirect(url_for('feedlot.dashboard', feedlot_id=user['feedlot_id']))
+
+# Post-login handler for each valid user type
+_LOGIN_DISPATCH = {
+    'super_owner': _login_redirect_top_level,
+    'super_admin': _login_redirect_top_level,
+    'business_owner': _login_redirect_business,
+    'business_admin': _login_redirect_business,
+    'user': _login_redirect_user,
+}
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Login page for super owner, super admin, business owner, business admin, and users"""
+    # Already logged in - skip the login form and go straight to the user's dashboard
+    if request.method == 'GET':
+        authz = _get_authz()
+        if authz.user_id is not None:
+            if authz.user_type in _ADMIN_TYPES:
+                return redirect(_cached_url_for('top_level.dashboard'))
+            if authz.user_type == 'user' and authz.feedlot_id:
+                return redirect(url_for('feedlot.dashboard', feedlot_id=authz.feedlot_id))
+    
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         
-        user = User.find_by_username(username)
+        if _login_throttled(username):
+            flash('Invalid username or password.', 'error')
+            return render_template('auth/login.html')
+        
+        user = _cached_find_by_username(username)
         
-        if user and User.verify_password(user['password_hash'], password):
+        if _verify_login_password(user, password):
+            _clear_login_failures(username)
             if not user.get('is_active', True):
                 flash('Account is inactive.', 'error')
                 return render_template('auth/login.html')
             
             user_type = user.get('user_type')
             # Validate user type - reject old/invalid types
-            valid_types = ['super_owner', 'super_admin', 'business_owner', 'business_admin', 'user']
-            if user_type not in valid_types:
+            login_handler = _LOGIN_DISPATCH.get(user_type)
+            if login_handler is None:
                 flash('Invalid user account. Please contact an administrator.', 'error')
                 return render_template('auth/login.html')
             
-            session['user_id'] = str(user['_id'])
-            session['username'] = user['username']
-            session['user_type'] = user_type
-            # Store user profile data for quick access
-            session['user_profile'] = {
-                'first_name': user.get('first_name'),
-                'last_name': user.get('last_name'),
-                'profile_picture': user.get('profile_picture')
-            }
-            
-            if user_type in ['super_owner', 'super_admin']:
-                return redirect(url_for('top_level.dashboard'))
-            elif user_type in ['business_owner', 'business_admin']:
-                # Store feedlot_ids as list of strings
-                feedlot_ids = user.get('feedlot_ids', [])
-                session['feedlot_ids'] = [str(fid) for fid in feedlot_ids]
-                return redirect(url_for('top_level.dashboard'))
-            elif user_type == 'user':
-                session['feedlot_id'] = str(user['feedlot_id'])
-                return redirect(url_for('feedlot.dashboard', feedlot_id=user['feedlot_id']))
+            session.update(_login_session_data(user))
+            return login_handler(user)
         
+        _record_login_failure(username)
         flash('Invalid username or password.', 'error')
     
     return render_template('auth/login.html')
@@ -164,24 +319,28 @@ def feedlot_login(feedlot_code):
         username = request.form.get('username')
         password = request.form.get('password')
         
-        user = User.find_by_username(username)
+        if _login_throttled(username):
+            flash('Invalid username or password.', 'error')
+            return render_template('auth/login.html', feedlot=feedlot, feedlot_code=feedlot_code)
         
-        if user and User.verify_password(user['password_hash'], password):
+        user = _cached_find_by_username(username)
+        
+        if _verify_login_password(user, password):
+            _clear_login_failures(username)
             if not user.get('is_active', True):
                 flash('Account is inactive.', 'error')
                 return render_template('auth/login.html', feedlot=feedlot, feedlot_code=feedlot_code)
             
             user_type = user.get('user_type')
             # Validate user type - reject old/invalid types
-            valid_types = ['super_owner', 'super_admin', 'business_owner', 'business_admin', 'user']
-            if user_type not in valid_types:
+            if user_type not in _VALID_TYPES:
                 flash('Invalid user account. Please contact an administrator.', 'error')
                 return render_template('auth/login.html', feedlot=feedlot, feedlot_code=feedlot_code)
             
             # Validate feedlot access for business owners/admins
-            if user_type in ['business_owner', 'business_admin']:
-                user_feedlot_ids = [str(fid) for fid in user.get('feedlot_ids', [])]
-                if str(feedlot_id) not in user_feedlot_ids:
+            if user_type in _BUSINESS_TYPES:
+                user_feedlot_ids = tuple(map(str, user.get('feedlot_ids', ())))
+                if feedlot_id not in user_feedlot_ids:
                     flash('You do not have access to this feedlot.', 'error')
                     return render_template('auth/login.html', feedlot=feedlot, feedlot_code=feedlot_code)
             
@@ -192,30 +351,23 @@ def feedlot_login(feedlot_code):
                     flash('You do not have access to this feedlot.', 'error')
                     return render_template('auth/login.html', feedlot=feedlot, feedlot_code=feedlot_code)
             
-            # Set session data
-            session['user_id'] = str(user['_id'])
-            session['username'] = user['username']
-            session['user_type'] = user_type
-            session['user_profile'] = {
-                'first_name': user.get('first_name'),
-                'last_name': user.get('last_name'),
-                'profile_picture': user.get('profile_picture')
-            }
+            # Set session data in a single update
+            session_data = _login_session_data(user)
+            if user_type in _BUSINESS_TYPES:
+                # Store feedlot_ids as a tuple of strings (already built during validation)
+                session_data['feedlot_ids'] = user_feedlot_ids
+            elif user_type == 'user':
+                session_data['feedlot_id'] = user_feedlot_id
+            session.update(session_data)
             
             # Redirect based on user type
-            if user_type in ['super_owner', 'super_admin']:
+            if user_type in _SUPER_TYPES:
                 # Top level users go to top level dashboard
                 return redirect(url_for('top_level.dashboard'))
-            elif user_type in ['business_owner', 'business_admin']:
-                # Store feedlot_ids as list of strings
-                feedlot_ids = user.get('feedlot_ids', [])
-                session['feedlot_ids'] = [str(fid) for fid in feedlot_ids]
-                # Redirect to feedlot dashboard for the feedlot they logged into
-                return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
-            elif user_type == 'user':
-                session['feedlot_id'] = str(user['feedlot_id'])
-                return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
+            # Feedlot users go to the dashboard for the feedlot they logged into
+            return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
         
+        _record_login_failure(username)
         flash('Invalid username or password.', 'error')
     
     return render_template('auth/login.html', feedlot=feedlot, feedlot_code=feedlot_code)
@@ -224,14 +376,17 @@ def feedlot_login(feedlot_code):
 @login_required
 def register():
     """Registration page for creating new users (requires login)"""
-    from app.models.feedlot import Feedlot
+    # GET request - redirect to dashboard since we're using a modal now
+    if request.method != 'POST':
+        return redirect(url_for('top_level.dashboard'))
     
     # Super owner, super admin, business owner, and business admin can register users
-    user_type = session.get('user_type')
+    user_type = _get_authz().user_type
+    # Check if this is an AJAX request
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     
-    if user_type not in ['super_owner', 'super_admin', 'business_owner', 'business_admin']:
+    if user_type not in _ADMIN_TYPES:
         error_msg = 'Access denied. Super owner, super admin, business owner, or business admin access required.'
-        is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
         if is_ajax:
             return jsonify({'success': False, 'message': error_msg}), 403
         flash(error_msg, 'error')
@@ -240,125 +395,111 @@ def register():
         else:
             return redirect(url_for('top_level.dashboard'))
     
-    if request.method == 'POST':
-        # Check if this is an AJAX request
-        is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    def _error(error_msg, status_code):
+        """Return a JSON validation error (users are created from modals, so there is no form page to re-render)"""
+        return jsonify({'success': False, 'message': error_msg}), status_code
+    
+    try:
+        username = request.form.get('username')
+        email = request.form.get('email')
+        password = request.form.get('password')
+        new_user_type = request.form.get('user_type', 'user')
+        feedlot_id = request.form.get('feedlot_id') or request.args.get('feedlot_id')
+        # For multiple feedlots (business_admin, business_owner); drop repeated values, keeping order
+        feedlot_ids = list(dict.fromkeys(request.form.getlist('feedlot_ids')))
         
-        try:
-            username = request.form.get('username')
-            email = request.form.get('email')
-            password = request.form.get('password')
-            new_user_type = request.form.get('user_type', 'user')
-            feedlot_id = request.form.get('feedlot_id') or request.args.get('feedlot_id')
-            feedlot_ids = request.form.getlist('feedlot_ids')  # For multiple feedlots (business_admin, business_owner)
-            
-            # Validate required fields
-            if not username or not email or not password:
-                error_msg = 'Username, email, and password are required.'
-                if is_ajax:
-                    return jsonify({'success': False, 'message': error_msg}), 400
-                flash(error_msg, 'error')
-                feedlots = Feedlot.find_all()
-                return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-            
-            # Business owner and business admin cannot create super owner or super admin users
-            if user_type in ['business_owner', 'business_admin'] and new_user_type in ['super_owner', 'super_admin']:
-                error_msg = 'Business owner and business admin cannot create super owner or super admin users.'
-                if is_ajax:
-                    return jsonify({'success': False, 'message': error_msg}), 403
-                flash(error_msg, 'error')
-                feedlots = Feedlot.find_all()
-                return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-            
-            # Validate feedlot assignment based on user type
-            if new_user_type in ['business_admin', 'business_owner']:
-                if not feedlot_ids:
-                    error_msg = f'At least one feedlot must be assigned to {new_user_type.replace("_", " ")} users.'
-                    if is_ajax:
-                        return jsonify({'success': False, 'message': error_msg}), 400
-                    flash(error_msg, 'error')
-                    feedlots = Feedlot.find_all()
-                    return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-                # If current user is business owner or business admin, ensure they can only assign their own feedlots
-                if user_type in ['business_owner', 'business_admin']:
-                    user_feedlot_ids = [str(fid) for fid in session.get('feedlot_ids', [])]
-                    if not all(fid in user_feedlot_ids for fid in feedlot_ids):
-                        error_msg = 'You can only assign feedlots that you have access to.'
-                        if is_ajax:
-                            return jsonify({'success': False, 'message': error_msg}), 403
-                        flash(error_msg, 'error')
-                        feedlots = Feedlot.find_all()
-                        return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-            elif new_user_type == 'user':
-                if not feedlot_id:
-                    error_msg = 'Feedlot ID is required for users.'
-                    if is_ajax:
-                        return jsonify({'success': False, 'message': error_msg}), 400
-                    flash(error_msg, 'error')
-                    feedlots = Feedlot.find_all()
-                    return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-                # If current user is business owner or business admin, ensure they can only assign their own feedlots
-                if user_type in ['business_owner', 'business_admin']:
-                    user_feedlot_ids = [str(fid) for fid in session.get('feedlot_ids', [])]
-                    if str(feedlot_id) not in user_feedlot_ids:
-                        error_msg = 'You can only assign feedlots that you have access to.'
-                        if is_ajax:
-                            return jsonify({'success': False, 'message': error_msg}), 403
-                        flash(error_msg, 'error')
-                        feedlots = Feedlot.find_all()
-                        return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-            
-            # Check for duplicate username
-            if User.find_by_username(username):
-                error_msg = 'Username already exists.'
-                if is_ajax:
-                    return jsonify({'success': False, 'message': error_msg}), 400
-                flash(error_msg, 'error')
-                feedlots = Feedlot.find_all()
-                return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-            
-            # Check for duplicate email
-            if User.find_by_email(email):
-                error_msg = 'Email already exists.'
-                if is_ajax:
-                    return jsonify({'success': False, 'message': error_msg}), 400
-                flash(error_msg, 'error')
-                feedlots = Feedlot.find_all()
-                return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
-            
-            # Create the user
-            if new_user_type in ['business_admin', 'business_owner']:
-                user_id = User.create_user(username, email, password, new_user_type, feedlot_ids=feedlot_ids)
-            elif new_user_type in ['super_owner', 'super_admin']:
-                user_id = User.create_user(username, email, password, new_user_type)
-            else:
-                user_id = User.create_user(username, email, password, new_user_type, feedlot_id=feedlot_id)
-            success_msg = f'User "{username}" created successfully as {new_user_type.replace("_", " ")} user.'
-            
-            if is_ajax:
-                return jsonify({'success': True, 'message': success_msg}), 200
-            flash(success_msg, 'success')
-            
-            if new_user_type in ['super_owner', 'super_admin']:
-                return redirect(url_for('top_level.dashboard'))
-            else:
-                return redirect(url_for('top_level.feedlot_users', feedlot_id=feedlot_id))
+        # Validate required fields
+        if not username or not email or not password:
+            return _error('Username, email, and password are required.', 400)
         
-        except Exception as e:
-            error_msg = f'Failed to create user: {str(e)}'
-            if is_ajax:
-                return jsonify({'success': False, 'message': error_msg}), 500
-            flash(error_msg, 'error')
-            feedlots = Feedlot.find_all()
-            return render_template('auth/register.html', feedlots=feedlots, selected_feedlot_id=feedlot_id)
+        # Business owner and business admin cannot create super owner or super admin users
+        if user_type in _BUSINESS_TYPES and new_user_type in _SUPER_TYPES:
+            return _error('Business owner and business admin cannot create super owner or super admin users.', 403)
+        
+        # Validate feedlot assignment based on user type
+        if new_user_type in _BUSINESS_TYPES:
+            if not feedlot_ids:
+                return _error(f'At least one feedlot must be assigned to {_USER_TYPE_DISPLAY.get(new_user_type, new_user_type)} users.', 400)
+            # If current user is business owner or business admin, ensure they can only assign their own feedlots
+            if user_type in _BUSINESS_TYPES:
+                if not _get_authz().feedlot_ids.issuperset(feedlot_ids):
+                    return _error('You can only assign feedlots that you have access to.', 403)
+        elif new_user_type == 'user':
+            if not feedlot_id:
+                return _error('Feedlot ID is required for users.', 400)
+            # If current user is business owner or business admin, ensure they can only assign their own feedlots
+            if user_type in _BUSINESS_TYPES:
+                if str(feedlot_id) not in _get_authz().feedlot_ids:
+                    return _error('You can only assign feedlots that you have access to.', 403)
+        
+        # Check for duplicate username or email
+        existing_user = User.find_by_username_or_email(username, email)
+        if existing_user:
+            if existing_user.get('username') == username:
+                return _error('Username already exists.', 400)
+            return _error('Email already exists.', 400)
+        
+        # Create the user with the feedlot assignment for its type
+        create_kwargs = {}
+        if new_user_type in _BUSINESS_TYPES:
+            create_kwargs['feedlot_ids'] = feedlot_ids
+        elif new_user_type not in _SUPER_TYPES:
+            create_kwargs['feedlot_id'] = feedlot_id
+        user_id = User.create_user(username, email, password, new_user_type, **create_kwargs)
+        success_msg = f'User "{username}" created successfully as {_USER_TYPE_DISPLAY.get(new_user_type, new_user_type)} user.'
+        
+        if is_ajax:
+            return jsonify({'success': True, 'message': success_msg}), 200
+        flash(success_msg, 'success')
+        
+        if new_user_type in _SUPER_TYPES:
+            return redirect(url_for('top_level.dashboard'))
+        else:
+            return redirect(url_for('top_level.feedlot_users', feedlot_id=feedlot_id))
     
-    # GET request - redirect to dashboard since we're using a modal now
-    return redirect(url_for('top_level.dashboard'))
+    except Exception as e:
+        return _error(f'Failed to create user: {str(e)}', 500)
+
+PROFILE_PICTURE_MAX_BYTES = 5 * 1024 * 1024  # 5MB
+_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+def _save_upload_limited(file, file_path, max_bytes):
+    """Stream an uploaded file to disk in chunks, stopping once it exceeds max_bytes
+    
+    Args:
+        file: werkzeug FileStorage from request.files
+        file_path: Destination path (must not already exist)
+        max_bytes: Maximum allowed size in bytes
+    
+    Returns:
+        bool: True if the file was saved, False if it was too large (nothing is kept on disk)
+    """
+    total = 0
+    with open(file_path, 'xb') as out:
+        while True:
+            chunk = file.stream.read(_UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return True
+            total += len(chunk)
+            if total > max_bytes:
+                break
+            out.write(chunk)
+    os.unlink(file_path)
+    return False
+
+# Allowed profile picture extensions
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
+
+def get_file_extension(filename):
+    """Return the lowercase extension of filename, or '' if it has none"""
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
 
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Profile form fields, in the order profile() unpacks them
+_PROFILE_FORM_FIELDS = (
+    'username', 'email', 'first_name', 'last_name', 'contact_number',
+    'current_password', 'new_password', 'confirm_password',
+)
 
 @auth_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -375,32 +516,30 @@ def profile():
         return redirect(url_for('auth.login'))
     
     if request.method == 'POST':
-        username = request.form.get('username', '').strip()
-        email = request.form.get('email', '').strip()
-        first_name = request.form.get('first_name', '').strip()
-        last_name = request.form.get('last_name', '').strip()
-        contact_number = request.form.get('contact_number', '').strip()
-        current_password = request.form.get('current_password', '').strip()
-        new_password = request.form.get('new_password', '').strip()
-        confirm_password = request.form.get('confirm_password', '').strip()
+        (username, email, first_name, last_name, contact_number,
+         current_password, new_password, confirm_password) = (
+            request.form.get(field, '').strip() for field in _PROFILE_FORM_FIELDS
+        )
         
         # Validate required fields
         if not username or not email:
             flash('Username and email are required.', 'error')
             return render_template('auth/profile.html', user=user)
         
-        # Check if username is being changed and if it's already taken
-        if username != user.get('username'):
-            existing_user = User.find_by_username(username)
-            if existing_user and str(existing_user['_id']) != user_id:
-                flash('Username already exists.', 'error')
-                return render_template('auth/profile.html', user=user)
-        
-        # Check if email is being changed and if it's already taken
-        if email != user.get('email'):
-            existing_user = User.find_by_email(email)
-            if existing_user and str(existing_user['_id']) != user_id:
-                flash('Email already exists.', 'error')
+        # Check if username or email is being changed and already taken, in one query
+        username_changed = username != user.get('username')
+        email_changed = email != user.get('email')
+        if username_changed or email_changed:
+            existing_user = User.find_duplicate(
+                username if username_changed else None,
+                email if email_changed else None,
+                user_id
+            )
+            if existing_user:
+                if username_changed and existing_user.get('username') == username:
+                    flash('Username already exists.', 'error')
+                else:
+                    flash('Email already exists.', 'error')
                 return render_template('auth/profile.html', user=user)
         
         # Prepare update data
@@ -417,44 +556,35 @@ def profile():
             file = request.files['profile_picture']
             if file and file.filename:
                 # Validate file type
-                if not allowed_file(file.filename):
+                file_ext = get_file_extension(file.filename)
+                if file_ext not in ALLOWED_EXTENSIONS:
                     flash('Invalid file type. Please upload a PNG, JPG, JPEG, GIF, or WEBP image.', 'error')
                     return render_template('auth/profile.html', user=user)
                 
-                # Validate file size (max 5MB for images)
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-                if file_size > 5 * 1024 * 1024:  # 5MB
-                    flash('File size too large. Please upload an image smaller than 5MB.', 'error')
-                    return render_template('auth/profile.html', user=user)
-                
                 # Generate unique filename
-                file_ext = file.filename.rsplit('.', 1)[1].lower()
-                filename = f"{user_id}_{uuid.uuid4().hex[:8]}.{file_ext}"
+                filename = f"{user_id}_{secrets.token_hex(4)}.{file_ext}"
                 filename = secure_filename(filename)
                 
                 # Create profile_pictures directory if it doesn't exist
                 profile_pics_dir = os.path.join(current_app.static_folder, 'profile_pictures')
                 os.makedirs(profile_pics_dir, exist_ok=True)
                 
+                # Save new profile picture, validating file size (max 5MB for images) as it streams
+                file_path = os.path.join(profile_pics_dir, filename)
+                if not _save_upload_limited(file, file_path, PROFILE_PICTURE_MAX_BYTES):
+                    flash('File size too large. Please upload an image smaller than 5MB.', 'error')
+                    return render_template('auth/profile.html', user=user)
+                
                 # Delete old profile picture if it exists
                 old_picture = user.get('profile_picture')
                 if old_picture:
-                    # Handle both /static/... and static/... paths
                     # Extract filename from path like /static/profile_pictures/filename.jpg
-                    old_path_clean = old_picture.lstrip('/').replace('static/', '').replace('profile_pictures/', '')
-                    if old_path_clean:
-                        old_path = os.path.join(profile_pics_dir, old_path_clean)
-                        if os.path.exists(old_path) and os.path.isfile(old_path):
-                            try:
-                                os.remove(old_path)
-                            except Exception:
-                                pass  # Ignore errors when deleting old file
-                
-                # Save new profile picture
-                file_path = os.path.join(profile_pics_dir, filename)
-                file.save(file_path)
+                    old_filename = os.path.basename(old_picture)
+                    if old_filename:
+                        try:
+                            os.unlink(os.path.join(profile_pics_dir, old_filename))
+                        except OSError:
+                            pass  # Ignore missing files and errors when deleting old file
                 
                 # Store relative path in database
                 update_data['profile_picture'] = f'/static/profile_pictures/{filename}'
@@ -481,19 +611,25 @@ def profile():
                 return render_template('auth/profile.html', user=user)
             
             # Hash new password
-            hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+            hashed_password = User.hash_password(new_password)
             update_data['password_hash'] = hashed_password
         
+        # Only write fields that actually changed (a new password or picture always differs)
+        changed_data = {key: value for key, value in update_data.items() if user.get(key) != value}
+        
         # Update user
         try:
-            User.update_user(user_id, update_data)
+            if changed_data:
+                updated_user = User.update_user(user_id, changed_data, return_doc=True)
+            else:
+                # Nothing changed - skip the write
+                updated_user = user
             
             # Update session data if changed
             if username != session.get('username'):
                 session['username'] = username
             
             # Refresh user profile in session
-            updated_user = User.find_by_id(user_id)
             session['user_profile'] = {
                 'first_name': updated_user.get('first_name'),
                 'last_name': updated_user.get('last_name'),
@@ -1,5 +1,4 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response
-from bson import ObjectId
 from datetime import datetime
 from app.models.feedlot import Feedlot
 from app.models.pen import Pen
@@ -7,35 +6,58 @@ from app.models.batch import Batch
 from app.models.cattle import Cattle
 from app.models.manifest_template import ManifestTemplate
 from app.models.manifest import Manifest
-from app.routes.auth_routes import login_required, feedlot_access_required
+from app.routes.auth_routes import login_required, feedlot_access_required, get_request_feedlot
 from app.utils.manifest_generator import generate_manifest_data, generate_pdf
 
 feedlot_bp = Blueprint('feedlot', __name__)
 
+# Upper bound for the per_page query argument on paginated views
+MAX_PER_PAGE = 200
+
+# Allowed pen map grid width/height (matches the limits in pens/map.html)
+PEN_MAP_MIN_SIZE = 1
+PEN_MAP_MAX_SIZE = 20
+
 def get_feedlot_code(feedlot_id):
     """Helper function to get feedlot_code from feedlot_id"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if feedlot:
         return feedlot.get('feedlot_code')
     return None
 
-def convert_objectids_to_strings(data):
-    """Recursively convert ObjectId objects to strings for JSON serialization"""
-    if isinstance(data, dict):
-        return {key: convert_objectids_to_strings(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectids_to_strings(item) for item in data]
-    elif isinstance(data, ObjectId):
-        return str(data)
-    else:
-        return data
+def _pen_map_lookup(pens):
+    """Build the {pen_id: pen} lookup embedded as JSON in the pen map scripts
+    
+    Only the fields the map scripts read are included, so the page doesn't carry
+    every pen document in full.
+    """
+    return {str(pen['_id']): {'pen_number': pen.get('pen_number')} for pen in pens}
+
+def _parse_pen_placements(pen_placements, grid_width, grid_height):
+    """Validate pen map placements in a single pass
+    
+    Returns a list of {row, col, pen_id} dicts, or None if any placement is
+    malformed, falls outside the grid, or shares a cell with another.
+    """
+    placements = []
+    occupied = set()
+    try:
+        for placement in pen_placements:
+            row, col = int(placement['row']), int(placement['col'])
+            if not (0 <= row < grid_height and 0 <= col < grid_width) or (row, col) in occupied:
+                return None
+            occupied.add((row, col))
+            placements.append({'row': row, 'col': col, 'pen_id': str(placement['pen_id'])})
+    except (KeyError, TypeError, ValueError):
+        return None
+    return placements
 
 @feedlot_bp.route('/feedlot/<feedlot_id>/dashboard')
 @login_required
 @feedlot_access_required()
 def dashboard(feedlot_id):
     """Feedlot dashboard"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -45,32 +67,26 @@ def dashboard(feedlot_id):
         flash('Feedlot code not found.', 'error')
         return redirect(url_for('auth.login'))
     
-    statistics = Feedlot.get_statistics(feedlot_id)
+    statistics = Feedlot.get_statistics_cached(feedlot_id)
     
-    # Get all batches
-    all_batches = Batch.find_by_feedlot(feedlot_code, feedlot_id)
+    # Get the 5 most recent batches (sorted and limited by MongoDB)
+    recent_batches = Batch.find_recent(feedlot_code, feedlot_id, limit=5)
+    cattle_counts = Batch.get_cattle_counts(feedlot_code, [batch['_id'] for batch in recent_batches])
     
     # Normalize batch data: ensure event_date exists (for backward compatibility with induction_date)
     # Also add cattle count and ensure event_type exists
-    for batch in all_batches:
+    for batch in recent_batches:
         if 'event_date' not in batch and 'induction_date' in batch:
             batch['event_date'] = batch['induction_date']
         # Add cattle count
-        batch['cattle_count'] = Batch.get_cattle_count(feedlot_code, str(batch['_id']))
+        batch['cattle_count'] = cattle_counts.get(batch['_id'], 0)
         # Ensure event_type exists (default to 'induction' if not set)
         if 'event_type' not in batch:
             batch['event_type'] = 'induction'
-        # Ensure event_date exists for sorting (use created_at as fallback)
+        # Ensure event_date exists (use created_at as fallback)
         if 'event_date' not in batch:
             batch['event_date'] = batch.get('created_at')
     
-    # Sort by event_date descending (latest first), then take top 5
-    recent_batches = sorted(
-        all_batches,
-        key=lambda b: b.get('event_date') or b.get('created_at') or datetime.min,
-        reverse=True
-    )[:5]
-    
     user_type = session.get('user_type')
     
     return render_template('feedlot/dashboard.html', 
@@ -85,7 +101,7 @@ def dashboard(feedlot_id):
 @feedlot_access_required()
 def list_pens(feedlot_id):
     """List all pens for a feedlot"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -95,23 +111,14 @@ def list_pens(feedlot_id):
         flash('Feedlot code not found.', 'error')
         return redirect(url_for('auth.login'))
     
-    pens = Pen.find_by_feedlot(feedlot_id)
-    
-    # Add current cattle count to each pen
-    for pen in pens:
-        pen['current_count'] = Pen.get_current_cattle_count(str(pen['_id']), feedlot_code)
+    # Pens with their current cattle count
+    pens = Pen.find_by_feedlot_with_counts(feedlot_id, feedlot_code)
     
     # Get pen map configuration
-    pen_map = Feedlot.get_pen_map(feedlot_id)
+    pen_map = feedlot.get('pen_map')  # Already loaded with the feedlot
     
-    # Create pen lookup dictionary for map display (convert ObjectId to string)
-    pen_lookup = {}
-    if pen_map:
-        for pen in pens:
-            pen_id_str = str(pen['_id'])
-            # Convert all ObjectIds to strings for JSON serialization
-            pen_copy = convert_objectids_to_strings(pen)
-            pen_lookup[pen_id_str] = pen_copy
+    # Create pen lookup dictionary for map display
+    pen_lookup = _pen_map_lookup(pens) if pen_map else {}
     
     return render_template('feedlot/pens/list.html', 
                          feedlot=feedlot, 
@@ -124,7 +131,7 @@ def list_pens(feedlot_id):
 @feedlot_access_required()
 def create_pen(feedlot_id):
     """Create a new pen"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -136,9 +143,13 @@ def create_pen(feedlot_id):
     
     if request.method == 'POST':
         pen_number = request.form.get('pen_number')
-        capacity = int(request.form.get('capacity'))
+        capacity = request.form.get('capacity', type=int)
         description = request.form.get('description')
         
+        if capacity is None:
+            flash('Capacity must be a whole number.', 'error')
+            return render_template('feedlot/pens/create.html', feedlot=feedlot)
+        
         pen_id = Pen.create_pen(feedlot_id, pen_number, capacity, description)
         flash('Pen created successfully.', 'success')
         return redirect(url_for('feedlot.list_pens', feedlot_id=feedlot_id))
@@ -150,7 +161,7 @@ def create_pen(feedlot_id):
 @feedlot_access_required()
 def view_pen(feedlot_id, pen_id):
     """View pen details"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -166,17 +177,25 @@ def view_pen(feedlot_id, pen_id):
         flash('Pen not found.', 'error')
         return redirect(url_for('feedlot.list_pens', feedlot_id=feedlot_id))
     
-    cattle = Cattle.find_by_pen(feedlot_code, pen_id)
-    pen['current_count'] = len(cattle)
+    # Count in MongoDB and only load the page of cattle being shown
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+    pen['current_count'] = Pen.get_current_cattle_count(pen_id, feedlot_code)
+    cattle = Cattle.find_by_pen(feedlot_code, pen_id, limit=per_page, skip=(page - 1) * per_page, projection=Cattle.LIST_FIELDS)
+    total_pages = (pen['current_count'] + per_page - 1) // per_page
     
-    return render_template('feedlot/pens/view.html', feedlot=feedlot, pen=pen, cattle=cattle)
+    return render_template('feedlot/pens/view.html', feedlot=feedlot, pen=pen, cattle=cattle,
+                         page=page,
+                         per_page=per_page,
+                         total_count=pen['current_count'],
+                         total_pages=total_pages)
 
 @feedlot_bp.route('/feedlot/<feedlot_id>/pens/<pen_id>/edit', methods=['GET', 'POST'])
 @login_required
 @feedlot_access_required()
 def edit_pen(feedlot_id, pen_id):
     """Edit pen details"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -193,9 +212,14 @@ def edit_pen(feedlot_id, pen_id):
         return redirect(url_for('feedlot.list_pens', feedlot_id=feedlot_id))
     
     if request.method == 'POST':
+        capacity = request.form.get('capacity', type=int)
+        if capacity is None:
+            flash('Capacity must be a whole number.', 'error')
+            return render_template('feedlot/pens/edit.html', feedlot=feedlot, pen=pen)
+        
         update_data = {
             'pen_number': request.form.get('pen_number'),
-            'capacity': int(request.form.get('capacity')),
+            'capacity': capacity,
             'description': request.form.get('description')
         }
         
@@ -210,7 +234,7 @@ def edit_pen(feedlot_id, pen_id):
 @feedlot_access_required()
 def delete_pen(feedlot_id, pen_id):
     """Delete a pen"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -229,7 +253,7 @@ def delete_pen(feedlot_id, pen_id):
 @feedlot_access_required()
 def map_pens(feedlot_id):
     """Map pens on a grid layout"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -243,15 +267,24 @@ def map_pens(feedlot_id):
     
     if request.method == 'POST':
         data = request.get_json()
-        grid_width = int(data.get('grid_width', 10))
-        grid_height = int(data.get('grid_height', 10))
-        pen_placements = data.get('pen_placements', [])
+        try:
+            grid_width = int(data.get('grid_width', 10))
+            grid_height = int(data.get('grid_height', 10))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Grid width and height must be whole numbers.'}), 400
+        
+        if not (PEN_MAP_MIN_SIZE <= grid_width <= PEN_MAP_MAX_SIZE and PEN_MAP_MIN_SIZE <= grid_height <= PEN_MAP_MAX_SIZE):
+            return jsonify({'success': False, 'message': f'Grid dimensions must be between {PEN_MAP_MIN_SIZE} and {PEN_MAP_MAX_SIZE}.'}), 400
+        
+        pen_placements = _parse_pen_placements(data.get('pen_placements', []), grid_width, grid_height)
+        if pen_placements is None:
+            return jsonify({'success': False, 'message': 'Pen placements must be inside the grid and not overlap.'}), 400
         
         Feedlot.save_pen_map(feedlot_id, grid_width, grid_height, pen_placements)
         return jsonify({'success': True, 'message': 'Pen map saved successfully.'}), 200
     
     # Get existing pen map if available
-    pen_map = Feedlot.get_pen_map(feedlot_id)
+    pen_map = feedlot.get('pen_map')  # Already loaded with the feedlot
     
     return render_template('feedlot/pens/map.html', 
                          feedlot=feedlot, 
@@ -263,7 +296,7 @@ def map_pens(feedlot_id):
 @feedlot_access_required()
 def view_pen_map(feedlot_id):
     """View pen map (read-only display)"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -273,16 +306,11 @@ def view_pen_map(feedlot_id):
         flash('Feedlot code not found.', 'error')
         return redirect(url_for('auth.login'))
     
-    pens = Pen.find_by_feedlot(feedlot_id)
-    pen_map = Feedlot.get_pen_map(feedlot_id)
+    pens = Pen.find_by_feedlot_cached(feedlot_id)
+    pen_map = feedlot.get('pen_map')  # Already loaded with the feedlot
     
-    # Create pen lookup dictionary (convert ObjectId to string for JSON serialization)
-    pen_lookup = {}
-    for pen in pens:
-        pen_id_str = str(pen['_id'])
-        # Convert all ObjectIds to strings for JSON serialization
-        pen_copy = convert_objectids_to_strings(pen)
-        pen_lookup[pen_id_str] = pen_copy
+    # Create pen lookup dictionary for map display
+    pen_lookup = _pen_map_lookup(pens)
     
     return render_template('feedlot/pens/map_view.html',
                          feedlot=feedlot,
@@ -296,7 +324,7 @@ def view_pen_map(feedlot_id):
 @feedlot_access_required()
 def list_batches(feedlot_id):
     """List all batches for a feedlot with search, filter, and sort"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -312,19 +340,37 @@ def list_batches(feedlot_id):
     sort_by = request.args.get('sort_by', 'event_date')
     sort_order = request.args.get('sort_order', 'desc')
     
-    # Get filtered batches
+    # Get pagination parameters
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+    
+    total_count = Batch.count_with_filters(
+        feedlot_code,
+        feedlot_id,
+        search=search if search else None,
+        event_type=event_type_filter if event_type_filter else None
+    )
+    total_pages = (total_count + per_page - 1) // per_page
+    
+    # A page past the end shows the last page rather than an empty list
+    page = max(min(page, total_pages), 1)
+    skip = (page - 1) * per_page
+    
+    # Get filtered batches for the current page
     batches = Batch.find_by_feedlot_with_filters(
         feedlot_code,
         feedlot_id,
         search=search if search else None,
         event_type=event_type_filter if event_type_filter else None,
         sort_by=sort_by,
-        sort_order=sort_order
+        sort_order=sort_order,
+        projection=Batch.LIST_FIELDS,
+        limit=per_page,
+        skip=skip
     )
     
-    # Get unique event types for filter dropdown
-    all_batches = Batch.find_by_feedlot(feedlot_code, feedlot_id)
-    unique_event_types = list(set(b.get('event_type', 'induction') for b in all_batches if b.get('event_type')))
+    # Get unique event types for filter dropdown (computed by MongoDB)
+    unique_event_types = [t for t in Batch.distinct_values(feedlot_code, feedlot_id, 'event_type') if t]
     
     return render_template('feedlot/batches/list.html', 
                          feedlot=feedlot, 
@@ -333,14 +379,18 @@ def list_batches(feedlot_id):
                          current_search=search,
                          current_event_type=event_type_filter,
                          current_sort_by=sort_by,
-                         current_sort_order=sort_order)
+                         current_sort_order=sort_order,
+                         page=page,
+                         per_page=per_page,
+                         total_count=total_count,
+                         total_pages=total_pages)
 
 @feedlot_bp.route('/feedlot/<feedlot_id>/batches/create', methods=['GET', 'POST'])
 @login_required
 @feedlot_access_required()
 def create_batch(feedlot_id):
     """Create a new batch"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -363,7 +413,7 @@ def create_batch(feedlot_id):
             event_type = 'induction'
         
         # Convert date string to datetime object
-        event_date = datetime.strptime(event_date_str, '%Y-%m-%d') if event_date_str else None
+        event_date = datetime.fromisoformat(event_date_str) if event_date_str else None
         
         batch_id = Batch.create_batch(feedlot_code, feedlot_id, batch_number, event_date, funder, notes, event_type)
         flash('Batch created successfully.', 'success')
@@ -376,7 +426,7 @@ def create_batch(feedlot_id):
 @feedlot_access_required()
 def view_batch(feedlot_id, batch_id):
     """View batch details"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -396,20 +446,28 @@ def view_batch(feedlot_id, batch_id):
     if 'event_date' not in batch and 'induction_date' in batch:
         batch['event_date'] = batch['induction_date']
     
-    cattle = Cattle.find_by_batch(feedlot_code, batch_id)
-    batch['cattle_count'] = len(cattle)
+    # Count in MongoDB and only load the page of cattle being shown
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+    batch['cattle_count'] = Batch.get_cattle_count(feedlot_code, batch_id)
+    cattle = Cattle.find_by_batch(feedlot_code, batch_id, limit=per_page, skip=(page - 1) * per_page, projection=Cattle.LIST_FIELDS)
+    total_pages = (batch['cattle_count'] + per_page - 1) // per_page
     
-    # Get historical cattle count from the batch's cattle_ids array
-    batch['historical_cattle_count'] = Batch.get_historical_cattle_count(feedlot_code, batch_id)
+    # Historical cattle count comes from the batch's cattle_ids array (already loaded)
+    batch['historical_cattle_count'] = len(batch.get('cattle_ids', []))
     
-    return render_template('feedlot/batches/view.html', feedlot=feedlot, batch=batch, cattle=cattle)
+    return render_template('feedlot/batches/view.html', feedlot=feedlot, batch=batch, cattle=cattle,
+                         page=page,
+                         per_page=per_page,
+                         total_count=batch['cattle_count'],
+                         total_pages=total_pages)
 
 @feedlot_bp.route('/feedlot/<feedlot_id>/batches/<batch_id>/edit', methods=['GET', 'POST'])
 @login_required
 @feedlot_access_required()
 def edit_batch(feedlot_id, batch_id):
     """Edit batch details"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -442,7 +500,7 @@ def edit_batch(feedlot_id, batch_id):
             event_type = 'induction'
         
         # Convert date string to datetime object
-        event_date = datetime.strptime(event_date_str, '%Y-%m-%d') if event_date_str else None
+        event_date = datetime.fromisoformat(event_date_str) if event_date_str else None
         
         update_data = {
             'batch_number': batch_number,
@@ -463,7 +521,7 @@ def edit_batch(feedlot_id, batch_id):
 @feedlot_access_required()
 def delete_batch(feedlot_id, batch_id):
     """Delete a batch"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -489,7 +547,7 @@ def delete_batch(feedlot_id, batch_id):
 @feedlot_access_required()
 def list_cattle(feedlot_id):
     """List all cattle for a feedlot with search, filter, and sort"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -507,8 +565,13 @@ def list_cattle(feedlot_id):
     sort_by = request.args.get('sort_by', 'cattle_id')
     sort_order = request.args.get('sort_order', 'asc')
     
-    # Get filtered cattle
-    cattle = Cattle.find_by_feedlot_with_filters(
+    # Get pagination parameters
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+    skip = (page - 1) * per_page
+    
+    # Get the page of filtered cattle, its totals and the dropdown values in one query
+    result = Cattle.find_list_page(
         feedlot_code,
         feedlot_id,
         search=search if search else None,
@@ -516,40 +579,52 @@ def list_cattle(feedlot_id):
         sex=sex_filter if sex_filter else None,
         pen_id=pen_filter if pen_filter else None,
         sort_by=sort_by,
-        sort_order=sort_order
+        sort_order=sort_order,
+        projection=Cattle.LIST_FIELDS,
+        limit=per_page,
+        skip=skip
     )
+    cattle = result['cattle']
+    total_count = result['total_count']
+    total_pages = (total_count + per_page - 1) // per_page
     
-    # Get all pens for filter dropdown
-    pens = Pen.find_by_feedlot(feedlot_id)
+    # A page past the end redirects to the last page rather than showing an empty list
+    if total_pages and page > total_pages:
+        args = request.args.to_dict()
+        args['page'] = total_pages
+        return redirect(url_for('feedlot.list_cattle', feedlot_id=feedlot_id, **args))
     
-    # Create pen lookup dictionary for efficient template access
-    pen_map = {str(pen['_id']): pen for pen in pens}
+    # Get all pens for filter dropdown
+    pens = Pen.find_by_feedlot_cached(feedlot_id)
     
-    # Get unique values for filter dropdowns
-    all_cattle = Cattle.find_by_feedlot(feedlot_code, feedlot_id)
-    unique_cattle_statuses = list(set(c.get('cattle_status', '') for c in all_cattle if c.get('cattle_status')))
-    unique_sexes = list(set(c.get('sex', '') for c in all_cattle if c.get('sex')))
+    # Pen lookup dictionary for efficient template access (cached alongside the pen list)
+    pen_map = Pen.find_lookup_cached(feedlot_id)
     
     return render_template('feedlot/cattle/list.html', 
                          feedlot=feedlot, 
                          cattle=cattle,
                          pens=pens,
                          pen_map=pen_map,
-                         unique_cattle_statuses=sorted(unique_cattle_statuses),
-                         unique_sexes=sorted(unique_sexes),
+                         unique_cattle_statuses=sorted(result['cattle_statuses']),
+                         unique_sexes=sorted(result['sexes']),
                          current_search=search,
                          current_cattle_status=cattle_status_filter,
                          current_sex=sex_filter,
                          current_pen=pen_filter,
                          current_sort_by=sort_by,
-                         current_sort_order=sort_order)
+                         current_sort_order=sort_order,
+                         summary=result,
+                         page=page,
+                         per_page=per_page,
+                         total_count=total_count,
+                         total_pages=total_pages)
 
 @feedlot_bp.route('/feedlot/<feedlot_id>/cattle/create', methods=['GET', 'POST'])
 @login_required
 @feedlot_access_required()
 def create_cattle(feedlot_id):
     """Create cattle record"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -563,7 +638,7 @@ def create_cattle(feedlot_id):
         batch_id = request.form.get('batch_id') or None
         cattle_id = request.form.get('cattle_id')
         sex = request.form.get('sex')
-        weight = float(request.form.get('weight'))
+        weight = request.form.get('weight', type=float)
         cattle_status = request.form.get('cattle_status')
         lf_tag = request.form.get('lf_tag')
         uhf_tag = request.form.get('uhf_tag')
@@ -575,11 +650,21 @@ def create_cattle(feedlot_id):
         brand_locations = request.form.get('brand_locations')
         other_marks = request.form.get('other_marks')
         
+        if weight is None:
+            flash('Weight must be a number.', 'error')
+            batches = Batch.find_by_feedlot(feedlot_code, feedlot_id, projection=Batch.LIST_FIELDS)
+            pens = Pen.find_by_feedlot_cached(feedlot_id)
+            return render_template('feedlot/cattle/create.html', 
+                                 feedlot=feedlot, 
+                                 batches=batches, 
+                                 pens=pens)
+        
         # Check pen capacity if pen is assigned
-        if pen_id and not Pen.is_capacity_available(pen_id, feedlot_code):
+        # The pen's capacity comes from the cached pen lookup; the cattle count is always live
+        if pen_id and not Pen.is_capacity_available(pen_id, feedlot_code, pen=Pen.find_lookup_cached(feedlot_id).get(pen_id)):
             flash('Pen is at full capacity.', 'error')
-            batches = Batch.find_by_feedlot(feedlot_code, feedlot_id)
-            pens = Pen.find_by_feedlot(feedlot_id)
+            batches = Batch.find_by_feedlot(feedlot_code, feedlot_id, projection=Batch.LIST_FIELDS)
+            pens = Pen.find_by_feedlot_cached(feedlot_id)
             return render_template('feedlot/cattle/create.html', 
                                  feedlot=feedlot, 
                                  batches=batches, 
@@ -592,8 +677,8 @@ def create_cattle(feedlot_id):
         flash('Cattle record created successfully.', 'success')
         return redirect(url_for('feedlot.list_cattle', feedlot_id=feedlot_id))
     
-    batches = Batch.find_by_feedlot(feedlot_code, feedlot_id)
-    pens = Pen.find_by_feedlot(feedlot_id)
+    batches = Batch.find_by_feedlot(feedlot_code, feedlot_id, projection=Batch.LIST_FIELDS)
+    pens = Pen.find_by_feedlot_cached(feedlot_id)
     
     return render_template('feedlot/cattle/create.html', feedlot=feedlot, batches=batches, pens=pens)
 
@@ -602,7 +687,7 @@ def create_cattle(feedlot_id):
 @feedlot_access_required()
 def view_cattle(feedlot_id, cattle_id):
     """View cattle details"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -612,14 +697,15 @@ def view_cattle(feedlot_id, cattle_id):
         flash('Feedlot code not found.', 'error')
         return redirect(url_for('auth.login'))
     
-    cattle = Cattle.find_by_id(feedlot_code, cattle_id)
+    # Cattle and its batch come back from one aggregation
+    cattle, batch = Cattle.find_by_id_with_batch(feedlot_code, cattle_id)
     
     if not cattle:
         flash('Cattle record not found.', 'error')
         return redirect(url_for('feedlot.list_cattle', feedlot_id=feedlot_id))
     
-    pen = Pen.find_by_id(cattle['pen_id']) if cattle.get('pen_id') else None
-    batch = Batch.find_by_id(feedlot_code, cattle['batch_id']) if cattle.get('batch_id') else None
+    # Pens are in the master database; use the cached pen lookup
+    pen = Pen.find_lookup_cached(feedlot_id).get(str(cattle['pen_id'])) if cattle.get('pen_id') else None
     
     return render_template('feedlot/cattle/view.html', 
                          feedlot=feedlot, 
@@ -632,7 +718,7 @@ def view_cattle(feedlot_id, cattle_id):
 @feedlot_access_required()
 def move_cattle(feedlot_id, cattle_id):
     """Move cattle to different pen"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -652,9 +738,10 @@ def move_cattle(feedlot_id, cattle_id):
         new_pen_id = request.form.get('pen_id')
         moved_by = session.get('username', 'user')
         
-        if new_pen_id and not Pen.is_capacity_available(new_pen_id, feedlot_code):
+        # The pen's capacity comes from the cached pen lookup; the cattle count is always live
+        if new_pen_id and not Pen.is_capacity_available(new_pen_id, feedlot_code, pen=Pen.find_lookup_cached(feedlot_id).get(new_pen_id)):
             flash('Selected pen is at full capacity.', 'error')
-            pens = Pen.find_by_feedlot(feedlot_id)
+            pens = Pen.find_by_feedlot_cached(feedlot_id)
             return render_template('feedlot/cattle/move.html', 
                                  feedlot=feedlot, 
                                  cattle=cattle, 
@@ -664,7 +751,7 @@ def move_cattle(feedlot_id, cattle_id):
         flash('Cattle moved successfully.', 'success')
         return redirect(url_for('feedlot.view_cattle', feedlot_id=feedlot_id, cattle_id=cattle_id))
     
-    pens = Pen.find_by_feedlot(feedlot_id)
+    pens = Pen.find_by_feedlot_cached(feedlot_id)
     return render_template('feedlot/cattle/move.html', feedlot=feedlot, cattle=cattle, pens=pens)
 
 @feedlot_bp.route('/feedlot/<feedlot_id>/cattle/<cattle_id>/add_weight', methods=['GET', 'POST'])
@@ -672,7 +759,7 @@ def move_cattle(feedlot_id, cattle_id):
 @feedlot_access_required()
 def add_weight_record(feedlot_id, cattle_id):
     """Add a weight record for cattle"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -689,9 +776,13 @@ def add_weight_record(feedlot_id, cattle_id):
         return redirect(url_for('feedlot.list_cattle', feedlot_id=feedlot_id))
     
     if request.method == 'POST':
-        weight = float(request.form.get('weight'))
+        weight = request.form.get('weight', type=float)
         recorded_by = request.form.get('recorded_by', 'user')
         
+        if weight is None:
+            flash('Weight must be a number.', 'error')
+            return render_template('feedlot/cattle/add_weight.html', feedlot=feedlot, cattle=cattle)
+        
         Cattle.add_weight_record(feedlot_code, cattle_id, weight, recorded_by)
         flash('Weight record added successfully.', 'success')
         return redirect(url_for('feedlot.view_cattle', feedlot_id=feedlot_id, cattle_id=cattle_id))
@@ -703,7 +794,7 @@ def add_weight_record(feedlot_id, cattle_id):
 @feedlot_access_required()
 def add_note(feedlot_id, cattle_id):
     """Add a note for cattle"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -738,7 +829,7 @@ def add_note(feedlot_id, cattle_id):
 @feedlot_access_required()
 def update_tags(feedlot_id, cattle_id):
     """Update/re-pair LF and UHF tags for cattle"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -770,7 +861,7 @@ def update_tags(feedlot_id, cattle_id):
 @feedlot_access_required()
 def delete_cattle(feedlot_id, cattle_id):
     """Delete a cattle record"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('auth.login'))
@@ -797,7 +888,7 @@ def delete_cattle(feedlot_id, cattle_id):
 @feedlot_access_required()
 def export_manifest(feedlot_id):
     """Export manifest for cattle"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
@@ -897,13 +988,14 @@ def export_manifest(feedlot_id):
         flash('Feedlot code not found.', 'error')
         return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
     
-    pens = Pen.find_by_feedlot(feedlot_id)
+    pens = Pen.find_by_feedlot_with_counts(feedlot_id, feedlot_code)
     
     # Filter cattle by status = 'Export'
     all_cattle = Cattle.find_by_feedlot_with_filters(
         feedlot_code, 
         feedlot_id, 
-        cattle_status='Export'
+        cattle_status='Export',
+        projection=Cattle.LIST_FIELDS
     )
     
     # Convert ObjectIds to strings for cattle _id, batch_id and pen_id for easier template handling
@@ -915,7 +1007,7 @@ def export_manifest(feedlot_id):
             cattle['pen_id'] = str(cattle['pen_id'])
     
     # Filter batches by event_type = 'export'
-    all_batches = Batch.find_by_feedlot(feedlot_code, feedlot_id)
+    all_batches = Batch.find_by_feedlot(feedlot_code, feedlot_id, projection=Batch.LIST_FIELDS)
     export_batches = [b for b in all_batches if b.get('event_type') == 'export']
     
     # Convert batch ObjectIds to strings
@@ -925,7 +1017,7 @@ def export_manifest(feedlot_id):
     # Convert pen ObjectIds to strings
     for pen in pens:
         pen['_id'] = str(pen['_id'])
-        pen['cattle_count'] = Pen.get_current_cattle_count(pen['_id'], feedlot_code)
+        pen['cattle_count'] = pen['current_count']
     
     templates = ManifestTemplate.find_by_feedlot(feedlot_id)
     
@@ -941,7 +1033,7 @@ def export_manifest(feedlot_id):
 @feedlot_access_required()
 def list_manifest_templates(feedlot_id):
     """List manifest templates for a feedlot"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
@@ -956,7 +1048,7 @@ def list_manifest_templates(feedlot_id):
 @feedlot_access_required()
 def create_manifest_template(feedlot_id):
     """Create a new manifest template"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
@@ -991,7 +1083,7 @@ def create_manifest_template(feedlot_id):
 @feedlot_access_required()
 def edit_manifest_template(feedlot_id, template_id):
     """Edit a manifest template"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     template = ManifestTemplate.find_by_id(template_id)
     
     if not feedlot or not template:
@@ -1038,14 +1130,14 @@ def delete_manifest_template(feedlot_id, template_id):
 @feedlot_access_required()
 def list_manifest_history(feedlot_id):
     """List manifest history for a feedlot"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     if not feedlot:
         flash('Feedlot not found.', 'error')
         return redirect(url_for('feedlot.dashboard', feedlot_id=feedlot_id))
     
     # Get pagination parameters
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(request.args.get('per_page', 20, type=int), 1)
     skip = (page - 1) * per_page
     
     # Get manifests
@@ -1066,7 +1158,7 @@ def list_manifest_history(feedlot_id):
 @feedlot_access_required()
 def view_manifest_history(feedlot_id, manifest_id):
     """View a specific manifest from history"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     manifest = Manifest.find_by_id(manifest_id)
     
     if not feedlot or not manifest:
@@ -1090,7 +1182,7 @@ def view_manifest_history(feedlot_id, manifest_id):
 @feedlot_access_required()
 def download_manifest_history(feedlot_id, manifest_id):
     """Download a manifest from history as PDF"""
-    feedlot = Feedlot.find_by_id(feedlot_id)
+    feedlot = get_request_feedlot(feedlot_id)
     manifest = Manifest.find_by_id(manifest_id)
     
     if not feedlot or not manifest:
@@ -10,10 +10,10 @@ from app.models.cattle import Cattle
 from app.models.manifest_template import ManifestTemplate
 from app.routes.auth_routes import login_required, super_admin_required, admin_access_required
 from app import db
-import bcrypt
 import re
 import os
 import uuid
+import heapq
 from werkzeug.utils import secure_filename
 
 top_level_bp = Blueprint('top_level', __name__)
@@ -40,7 +40,7 @@ def can_edit_feedlot(feedlot_id, user_type, user_feedlot_ids):
     
     # Business Owner can only edit their assigned feedlots
     if user_type == 'business_owner':
-        return str(feedlot_id) in [str(fid) for fid in user_feedlot_ids]
+        return str(feedlot_id) in map(str, user_feedlot_ids)
     
     return False
 
@@ -82,7 +82,7 @@ def dashboard():
         # Aggregate statistics from each feedlot's database
         for feedlot in feedlots:
             feedlot_id = str(feedlot['_id'])
-            stats = Feedlot.get_statistics(feedlot_id)
+            stats = Feedlot.get_statistics_cached(feedlot_id)
             total_pens += stats.get('total_pens', 0)
             total_cattle += stats.get('total_cattle', 0)
         
@@ -112,7 +112,7 @@ def dashboard():
             })
     
     # Get recent feedlots (last 5)
-    recent_feedlots = sorted(feedlots, key=lambda x: x.get('created_at', datetime(1970, 1, 1)), reverse=True)[:5]
+    recent_feedlots = heapq.nlargest(5, feedlots, key=lambda x: x.get('created_at', datetime(1970, 1, 1)))
     
     dashboard_stats = {
         'total_feedlots': total_feedlots,
@@ -161,7 +161,7 @@ def feedlot_hub():
         feedlot_id = str(feedlot['_id'])
         
         # Get statistics for this feedlot (uses feedlot-specific database)
-        stats = Feedlot.get_statistics(feedlot_id)
+        stats = Feedlot.get_statistics_cached(feedlot_id)
         
         # Get owner information
         owner = Feedlot.get_owner(feedlot_id)
@@ -175,7 +175,7 @@ def feedlot_hub():
         enriched_feedlots.append(enriched_feedlot)
     
     # Get unique locations for filter dropdown
-    unique_locations = sorted(list(set([f.get('location', '') for f in enriched_feedlots if f.get('location')])))
+    unique_locations = sorted({f['location'] for f in enriched_feedlots if f.get('location')})
     
     user_type = session.get('user_type')
     return render_template('top_level/feedlot_hub.html', feedlots=enriched_feedlots, user_type=user_type, unique_locations=unique_locations)
@@ -302,7 +302,7 @@ def create_feedlot_wizard():
                 continue  # Skip duplicate email
             
             # Hash password
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            password_hash = User.hash_password(password)
             
             # Create user with feedlot assignment
             user_insert_data = {
@@ -484,8 +484,8 @@ def view_feedlot(feedlot_id):
     # Check if business owner or business admin has access to this feedlot
     user_type = session.get('user_type')
     if user_type in ['business_owner', 'business_admin']:
-        user_feedlot_ids = [str(fid) for fid in session.get('feedlot_ids', [])]
-        if str(feedlot_id) not in user_feedlot_ids:
+        user_feedlot_ids = session.get('feedlot_ids', ())
+        if str(feedlot_id) not in map(str, user_feedlot_ids):
             flash('Access denied. You do not have access to this feedlot.', 'error')
             return redirect(url_for('top_level.dashboard'))
     
@@ -561,6 +561,7 @@ def edit_feedlot(feedlot_id):
                     {'_id': ObjectId(feedlot_id)},
                     {'$unset': {'owner_id': ''}}
                 )
+                Feedlot.invalidate_cache()
         
         # Update feedlot with all fields
         Feedlot.update_feedlot(feedlot_id, update_data)
@@ -637,6 +638,7 @@ def delete_feedlot(feedlot_id):
         
         # Delete the feedlot record
         db.feedlots.delete_one({'_id': ObjectId(feedlot_id)})
+        Feedlot.invalidate_cache()
         
         flash(f'Feedlot "{feedlot_name}" and all associated data have been deleted successfully.', 'success')
         return redirect(url_for('top_level.dashboard'))
@@ -792,8 +794,8 @@ def feedlot_users(feedlot_id):
     # Check if business owner or business admin has access to this feedlot
     user_type = session.get('user_type')
     if user_type in ['business_owner', 'business_admin']:
-        user_feedlot_ids = [str(fid) for fid in session.get('feedlot_ids', [])]
-        if str(feedlot_id) not in user_feedlot_ids:
+        user_feedlot_ids = session.get('feedlot_ids', ())
+        if str(feedlot_id) not in map(str, user_feedlot_ids):
             flash('Access denied. You do not have access to this feedlot.', 'error')
             return redirect(url_for('top_level.dashboard'))
     
@@ -807,7 +809,7 @@ def feedlot_users(feedlot_id):
     
     # Get feedlots for the edit modal (only for top-level users)
     if user_type in ['super_owner', 'super_admin']:
-        feedlots = Feedlot.find_all()
+        feedlots = Feedlot.find_all_cached()
     else:
         feedlots = []
     
@@ -932,7 +934,7 @@ def edit_user(user_id):
                 'user_type': user.get('user_type', 'user'),
                 'is_active': user.get('is_active', True),
                 'feedlot_id': str(user.get('feedlot_id', '')) if user.get('feedlot_id') else '',
-                'feedlot_ids': [str(fid) for fid in user.get('feedlot_ids', [])] if user.get('feedlot_ids') else []
+                'feedlot_ids': list(map(str, user.get('feedlot_ids') or ()))
             }
             return jsonify({'success': True, 'user': user_data})
         else:
@@ -1034,7 +1036,7 @@ def edit_user(user_id):
                 return redirect(url_for('top_level.manage_users'))
             
             # Hash new password
-            hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+            hashed_password = User.hash_password(new_password)
             update_data['password_hash'] = hashed_password
         
         # Update user
@@ -1105,7 +1107,7 @@ def settings():
     # Get feedlots for the erase feedlot data modal (only for super owner/super admin)
     feedlots = []
     if user_type in ['super_owner', 'super_admin']:
-        feedlots = Feedlot.find_all()
+        feedlots = Feedlot.find_all_cached()
     
     return render_template('top_level/settings.html', user_type=user_type, feedlots=feedlots)
 
@@ -1363,7 +1365,7 @@ def load_test_data():
             # Generate 1-10 batches per feedlot
             num_batches = random.randint(1, 10)
             created_batches = []
-            existing_batches = Batch.find_by_feedlot(feedlot_code_normalized, feedlot_id)
+            existing_batches = Batch.find_by_feedlot(feedlot_code_normalized, feedlot_id, projection={'batch_number': 1})
             existing_batch_numbers = {batch.get('batch_number') for batch in existing_batches}
             
             base_date = datetime.utcnow() - timedelta(days=random.randint(30, 180))
@@ -1400,7 +1402,7 @@ def load_test_data():
             # Generate 50-300 cattle per feedlot
             num_cattle = random.randint(50, 300)
             created_cattle = 0
-            existing_cattle = Cattle.find_by_feedlot(feedlot_code_normalized, feedlot_id)
+            existing_cattle = Cattle.find_by_feedlot(feedlot_code_normalized, feedlot_id, projection={'cattle_id': 1})
             existing_cattle_ids = {cattle.get('cattle_id') for cattle in existing_cattle}
             
             # Sample notes for random addition
@@ -1640,6 +1642,7 @@ def erase_all_data():
         
         # Delete all feedlots from main database
         db.feedlots.delete_many({})
+        Feedlot.invalidate_cache()
         
         # Delete all API keys from main database
         db.api_keys.delete_many({})
@@ -1647,6 +1650,7 @@ def erase_all_data():
         # Also check for pens in main database (in case they exist there)
         if hasattr(db, 'pens'):
             db.pens.delete_many({})
+            Pen.invalidate_cache()
         
         flash('All data erased successfully. All feedlots and their data have been deleted. Users were preserved.', 'success')
         return redirect(url_for('top_level.settings'))
@@ -1712,6 +1716,7 @@ def erase_feedlot_data():
         
         # Delete all pens for this feedlot from main database
         db.pens.delete_many({'feedlot_id': ObjectId(feedlot_id)})
+        Pen.invalidate_cache(feedlot_id)
         
         flash(f'Data erased for feedlot "{feedlot_name}": {cattle_count} cattle, {batches_count} batches, and {pens_count} pens deleted. Feedlot and users were preserved.', 'success')
         return redirect(url_for('top_level.settings'))
@@ -35,11 +35,31 @@ class Config:
     
     MONGODB_DB = os.environ.get('MONGODB_DB') or 'herdlinx_saas'
     
+    # Connection pool for the shared process-wide MongoClient
+    MONGODB_MAX_POOL_SIZE = int(os.environ.get('MONGODB_MAX_POOL_SIZE') or 50)
+    # Keep at 0 for serverless so cold starts don't open idle connections
+    MONGODB_MIN_POOL_SIZE = int(os.environ.get('MONGODB_MIN_POOL_SIZE') or 0)
+    
     
     # Session settings
     # Flask uses secure cookies by default, which work perfectly in serverless environments
     # SESSION_TYPE is only used if flask-session is explicitly configured
     SESSION_PERMANENT = False
+    # Only re-sign and send the session cookie when the session is modified
+    SESSION_REFRESH_EACH_REQUEST = False
+    # Setting REDIS_URL switches to server-side sessions stored in Redis via flask-session;
+    # the cookie then only carries a signed session id
+    REDIS_URL = os.environ.get('REDIS_URL')
+    if REDIS_URL:
+        SESSION_TYPE = 'redis'
+        SESSION_USE_SIGNER = True
+        SESSION_KEY_PREFIX = 'herdlinx:session:'
+    
+    # Security settings
+    # bcrypt cost factor for new password hashes (each step doubles hashing time)
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS') or 12)
+    # Cache successful bcrypt verifications in-process (off by default)
+    USE_VERIFY_PASSWORD_CACHE = os.environ.get('USE_VERIFY_PASSWORD_CACHE', '').lower() in ('1', 'true', 'yes')
     
     # Application settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
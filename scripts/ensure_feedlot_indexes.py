@@ -0,0 +1,82 @@
+"""
+Script to create the current set of indexes on every existing feedlot database.
+
+Feedlot databases get their indexes when the feedlot is created, so feedlots
+created before an index was added need this run once to pick it up. Creating
+an index that already exists is a no-op, so the script is safe to re-run.
+
+It also backfills event_date on legacy batches from induction_date (or
+created_at) so they sort correctly on the event_date index. Requires
+MongoDB 4.2+ for pipeline-style updates.
+
+Usage:
+    python scripts/ensure_feedlot_indexes.py
+
+Make sure to set up your environment variables (MONGODB_URI) before running.
+"""
+
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import db, get_feedlot_db
+from app.models import init_db
+from app.models.feedlot import Feedlot
+
+
+def backfill_batch_event_dates(feedlot_code):
+    """Set event_date on batches that lack one, from induction_date or created_at"""
+    feedlot_db = get_feedlot_db(feedlot_code)
+    from_induction = feedlot_db.batches.update_many(
+        {'event_date': None, 'induction_date': {'$ne': None}},
+        [{'$set': {'event_date': '$induction_date'}}]
+    )
+    from_created = feedlot_db.batches.update_many(
+        {'event_date': None, 'created_at': {'$ne': None}},
+        [{'$set': {'event_date': '$created_at'}}]
+    )
+    return from_induction.modified_count + from_created.modified_count
+
+
+def ensure_feedlot_indexes():
+    """Create master database indexes and indexes for each feedlot database"""
+    print("Ensuring master database indexes...")
+    init_db()
+    
+    # Get all feedlots from the main database
+    feedlots = list(db.feedlots.find({'deleted_at': None}))
+    print(f"Found {len(feedlots)} feedlots to process")
+    
+    processed = 0
+    for feedlot in feedlots:
+        feedlot_code = feedlot.get('feedlot_code')
+        feedlot_name = feedlot.get('name', 'Unknown')
+        
+        if not feedlot_code:
+            print(f"  Skipping feedlot {feedlot_name} - no feedlot_code")
+            continue
+        
+        try:
+            normalized_code = feedlot_code.lower().strip()
+            Feedlot.initialize_feedlot_database(normalized_code)
+            backfilled = backfill_batch_event_dates(normalized_code)
+            print(f"  Indexed feedlot: {feedlot_name} ({feedlot_code}), "
+                  f"backfilled event_date on {backfilled} batches")
+            processed += 1
+        except Exception as e:
+            print(f"  Error processing feedlot {feedlot_name}: {str(e)}")
+            continue
+    
+    print(f"\n{'='*50}")
+    print("Index creation complete!")
+    print(f"  Feedlots processed: {processed}")
+    print(f"{'='*50}")
+
+
+if __name__ == '__main__':
+    ensure_feedlot_indexes()